@@ -15,10 +15,16 @@ setup(
 
     packages=find_packages(),
 
+    python_requires=">=3.8",
+
     test_suite='tests',
-    install_requires=[
-        "termcolor>=1.1.0",
-    ],
+    # The tests compare the built-in colours with termcolor's.
+    tests_require=["termcolor>=1.1.0"],
+    # Colours work without termcolor; it is only used for colour names
+    # that statusbar.ansi does not know.
+    extras_require={
+        "termcolor": ["termcolor>=1.1.0"],
+    },
 
     # metadata for upload to PyPI
     author="Thomas Mailund",
@@ -35,5 +41,6 @@ setup(
         "Topic :: Utilities",
         "License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)",    # NOQA
         "Programming Language :: Python",
+        "Programming Language :: Python :: 3 :: Only",
     ],
 )
@@ -1,49 +1,496 @@
 """Module for constructing text-based status updates."""
 
-import shutil
+import time
 import itertools
-import termcolor
-from math import log10, ceil
+import functools
+import importlib
+import collections
 
+from . import ansi
+from .width import display_width, truncate, pad
 
-class _ProgressChunk:
-    def __init__(self, count, symbol, color, on_color, attrs):
-        self.count = count
+
+@functools.lru_cache(maxsize=None)
+def _compile_style(color, on_color, attrs):
+    """Get the prefix and suffix termcolor.colored puts around text.
+
+    Styles are compiled once and shared by all chunks that use them.
+    """
+    return ansi.style(color, on_color, attrs)
+
+
+# The terminal size is looked up once and then cached until the terminal
+# is resized, which we learn from SIGWINCH where there is such a signal.
+# Until a handler for it is installed, the size is not cached.
+_terminal_size_cache = None
+_resize_handler_installed = False
+
+
+def _install_resize_handler():
+    """Forget the terminal size when the terminal is resized.
+
+    A handler that was already installed for SIGWINCH is still called.
+    """
+    global _resize_handler_installed
+    if _resize_handler_installed:
+        return
+    import signal
+    if not hasattr(signal, 'SIGWINCH'):  # pragma: no cover
+        _resize_handler_installed = True
+        return
+    previous = signal.getsignal(signal.SIGWINCH)
+
+    def on_resize(signum, frame):
+        invalidate_terminal_size()
+        if callable(previous):
+            previous(signum, frame)
+
+    try:
+        signal.signal(signal.SIGWINCH, on_resize)
+    except ValueError:
+        # handlers can only be installed from the main thread, so we try
+        # again the next time the size is looked up.
+        return
+    _resize_handler_installed = True
+
+
+def invalidate_terminal_size():
+    """Look up the terminal size again the next time it is needed.
+
+    This happens by itself on SIGWINCH. Where there is no such signal,
+    call this when the terminal may have been resized.
+    """
+    global _terminal_size_cache
+    _terminal_size_cache = None
+
+
+def _terminal_size():
+    """Get the size of the terminal as (columns, lines)."""
+    global _terminal_size_cache
+    if _terminal_size_cache is not None:
+        return _terminal_size_cache
+    if not _resize_handler_installed:
+        _install_resize_handler()
+    # shutil is slow to import, so it is not imported until we need it.
+    import shutil
+    size = shutil.get_terminal_size()
+    if _resize_handler_installed:
+        _terminal_size_cache = size
+    return size
+
+
+@functools.lru_cache(maxsize=1024)
+def _repeat_symbol(symbol, width):
+    # symbols that are two columns wide fit half as many times, and any
+    # column left over is filled with a space.
+    symbol_width = max(1, display_width(symbol))
+    repeats, left_over = divmod(width, symbol_width)
+    return symbol * repeats + " " * left_over
+
+
+def _chunk_sizes(chunk_counts, width):
+    """Split width into chunks proportional to chunk_counts.
+
+    The chunks end at the rounded cumulative fractions of the width, so
+    rounding errors do not add up and the widths sum to width.
+    """
+    total = sum(chunk_counts)
+    chunk_real_widths = [chunk/total*width for chunk in chunk_counts]
+    chunk_break_points = \
+        [int(round(bp)) for bp in itertools.accumulate(chunk_real_widths)]
+
+    start_points = [0] + chunk_break_points[:-1]
+    end_points = chunk_break_points
+    chunk_widths = \
+        [(end-start) for (start, end) in zip(start_points, end_points)]
+
+    # assert sum(chunk_widths) == width
+    return chunk_widths
+
+
+# Blocks filling one to eight eighths of a cell from the left.
+_EIGHTHS = ('', '\u258f', '\u258e', '\u258d', '\u258c',
+            '\u258b', '\u258a', '\u2589', '\u2588')
+
+
+def _eighth_boundaries(chunk_counts, width):
+    """Find where chunks end, in eighths of a cell, in a bar width wide.
+
+    The boundaries are the rounded cumulative fractions of the eighths,
+    as in _chunk_sizes, moved so that a chunk with a non-zero count gets
+    at least one eighth and no cell is split more than once. Each
+    non-zero chunk then shows up in the bar, as long as there are no
+    more of them than there are cells.
+    """
+    units = 8 * width
+    total = sum(chunk_counts)
+    nonzero_after = sum(1 for count in chunk_counts if count)
+    boundaries = []
+    previous = 0
+    cumulative = 0
+    for count in chunk_counts[:-1]:
+        if not count:
+            boundaries.append(previous)
+            continue
+        cumulative += count
+        nonzero_after -= 1
+        boundary = max(int(round(cumulative / total * units)), previous + 1)
+        # leave an eighth for the next non-zero chunk and a cell for each
+        # of the others.
+        if nonzero_after:
+            boundary = max(previous,
+                           min(boundary, units - 8 * nonzero_after + 7))
+        if boundary % 8 and previous % 8 and \
+                boundary // 8 == previous // 8:
+            # the cell is already split, so the chunk ends at its end.
+            boundary = (previous // 8 + 1) * 8
+        boundaries.append(boundary)
+        previous = boundary
+    boundaries.append(units)
+    return boundaries
+
+
+@functools.lru_cache(maxsize=1024)
+def _split_cell(left, right, eighths):
+    """Format a cell where the left style ends and the right one starts.
+
+    The left style's colour fills eighths of the cell and the rest gets
+    the right style's colour as background.
+    """
+    background = None
+    if right is not None and right.color is not None:
+        background = "on_" + right.color
+        if background not in ansi.HIGHLIGHTS:
+            background = None
+    prefix, suffix = _compile_style(left.color, background, left.attrs)
+    return prefix + _EIGHTHS[eighths] + suffix
+
+
+def _format_eighths(chunks, width):
+    """Format chunks in width cells with eighth-of-a-cell resolution.
+
+    Whole cells are drawn with the chunks' symbols and the cells where
+    one chunk ends and the next starts with an eighth block.
+    """
+    if width <= 0:
+        return ""
+    counts = [chunk.count for chunk in chunks]
+    if not sum(counts):
+        return " " * width
+    boundaries = _eighth_boundaries(counts, width)
+    out = []
+    position = 0
+    for i, (chunk, end) in enumerate(zip(chunks, boundaries)):
+        if end <= position:
+            continue
+        style = chunk._style
+        whole = (end - position) // 8
+        if whole:
+            out.append(style.prefix + _repeat_symbol(style.symbol, whole) +
+                       style.suffix)
+            position += 8 * whole
+        if end > position:
+            right = None
+            for later, later_end in zip(chunks[i + 1:], boundaries[i + 1:]):
+                if later_end > end:
+                    right = later._style
+                    break
+            out.append(_split_cell(style, right, end - position))
+            position += 8
+    return "".join(out)
+
+
+_numpy_module = None
+
+
+def _numpy():
+    """Import NumPy the first time it is needed; None if not installed."""
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover
+            numpy = False
+        _numpy_module = numpy
+    return _numpy_module or None
+
+
+def _batch_chunk_sizes(rows, widths):
+    """Compute the chunk sizes of many progress bars in one go.
+
+    The rows are lists of chunk counts and widths the widths to split.
+    With NumPy installed the sizes are computed for all rows at once,
+    with the same floating point operations and round-half-to-even
+    rounding as _chunk_sizes, so the results are the same. Rows whose
+    counts sum to zero get None.
+    """
+    np = _numpy()
+    if np is None or not rows:
+        return [_chunk_sizes(counts, width) if sum(counts) else None
+                for counts, width in zip(rows, widths)]
+
+    lengths = [len(counts) for counts in rows]
+    columns = max(lengths)
+    if columns != min(lengths):
+        rows = [counts + [0] * (columns - len(counts)) for counts in rows]
+    matrix = np.array(rows, dtype=np.float64)
+    totals = matrix.sum(axis=1)
+    widths = np.array(widths, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        real_widths = matrix / totals[:, None] * widths[:, None]
+    break_points = np.rint(np.cumsum(real_widths, axis=1))
+    sizes = np.diff(break_points, axis=1, prepend=0)
+    sizes[totals == 0] = 0
+    return [
+        row[:length] if total else None
+        for row, length, total in zip(sizes.astype(np.int64).tolist(),
+                                      lengths, totals.tolist())
+    ]
+
+
+# Rates and estimated times are sampled with this clock; tests replace it.
+_clock = time.monotonic
+
+
+def _format_rate(rate):
+    """Format a rate in eight columns, using SI prefixes for large rates."""
+    if rate is None:
+        return "{:>6}/s".format("-")
+    for prefix in ["", "k", "M", "G", "T"]:
+        if rate < 999.95:
+            break
+        rate /= 1000
+    if prefix:
+        return "{:5.1f}{}/s".format(rate, prefix)
+    return "{:6.1f}/s".format(rate)
+
+
+def _format_eta(seconds):
+    """Format a time left in eight columns as hours:minutes:seconds."""
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(round(seconds))
+    if seconds >= 100 * 3600:
+        return "{:>8}".format(">99h")
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return "{:2}:{:02}:{:02}".format(hours, minutes, seconds)
+
+
+class _RateEstimator:
+    """Estimate how fast a count grows and when it will reach a total.
+
+    The rate is an exponentially weighted moving average of the rates
+    between samples, weighted by time so that a sample halflife seconds
+    old counts half as much as a new one. Samples closer than
+    min_interval to the previous one are ignored. It is sampled when
+    its status bar is formatted, so it costs nothing when counts change.
+    """
+
+    __slots__ = ('chunk', 'eta', 'halflife', 'min_interval',
+                 'rate', '_time', '_count')
+
+    def __init__(self, chunk, eta, halflife, min_interval=0.1):
+        self.chunk = chunk
+        self.eta = eta
+        self.halflife = halflife
+        self.min_interval = min_interval
+        self.rate = None
+        self._time = None
+        self._count = None
+
+    def update(self, now, count):
+        """Add a sample of the count at time now."""
+        if self._time is None:
+            self._time, self._count = now, count
+            return
+        elapsed = now - self._time
+        if elapsed < self.min_interval:
+            return
+        rate = (count - self._count) / elapsed
+        if self.rate is None:
+            self.rate = rate
+        else:
+            weight = 1 - 2 ** (-elapsed / self.halflife)
+            self.rate += weight * (rate - self.rate)
+        self._time, self._count = now, count
+
+    def format(self, count, total):
+        """Format the rate and, if enabled, the time left to reach total."""
+        rate = self.rate
+        text = _format_rate(None if rate is None else max(0.0, rate))
+        if self.eta:
+            left = None
+            if rate is not None and rate > 0:
+                left = max(0, total - count) / rate
+            text += " " + _format_eta(left)
+        return text
+
+    def width(self):
+        """The number of columns the formatted text uses."""
+        return 8 + (9 if self.eta else 0)
+
+
+class _ChunkStyle:
+    """The symbol and colours of a chunk, shared by all chunks that use them.
+
+    Get styles from _chunk_style so each combination exists only once.
+    """
+
+    __slots__ = ('symbol', 'color', 'on_color', 'attrs',
+                 'prefix', 'suffix', 'summary_prefix', 'summary_suffix')
+
+    def __init__(self, symbol, color, on_color, attrs):
         self.symbol = symbol
         self.color = color
         self.on_color = on_color
         self.attrs = attrs
+        # The ANSI codes are computed here, so the ANSI_COLORS_DISABLED
+        # environment variable is checked when the style is first used.
+        self.prefix, self.suffix = _compile_style(color, on_color, attrs)
+        self.summary_prefix, self.summary_suffix = \
+            _compile_style(color, None, attrs)
+
+
+@functools.lru_cache(maxsize=None)
+def _interned_style(symbol, color, on_color, attrs):
+    return _ChunkStyle(symbol, color, on_color, attrs)
+
+
+def _chunk_style(symbol, color=None, on_color=None, attrs=None):
+    """Get the shared style for a chunk."""
+    attrs = tuple(attrs) if attrs is not None else None
+    return _interned_style(symbol, color, on_color, attrs)
+
+
+class _ProgressChunk:
+    """A section of a progress bar.
+
+    Chunks are returned from add_progress and work as handles for
+    updating the progress; use increment() and set() rather than assigning
+    to count so the owning bar knows it must be formatted again.
+    """
+
+    __slots__ = ('count', '_style', '_bar')
+
+    def __init__(self, count, symbol, color, on_color, attrs, bar=None):
+        self.count = count
+        self._style = _chunk_style(symbol, color, on_color, attrs)
+        self._bar = bar
+
+    @property
+    def symbol(self):
+        """The symbol the chunk is drawn with."""
+        return self._style.symbol
+
+    @property
+    def color(self):
+        """The foreground colour of the chunk."""
+        return self._style.color
+
+    @property
+    def on_color(self):
+        """The background colour of the chunk."""
+        return self._style.on_color
+
+    @property
+    def attrs(self):
+        """The display attributes of the chunk."""
+        attrs = self._style.attrs
+        return list(attrs) if attrs is not None else None
+
+    def increment(self, n=1):
+        """Add n to the count of this chunk."""
+        self.count += n
+        if not self._bar._dirty:
+            self._bar._changed()
+
+    def set(self, count):
+        """Set the count of this chunk."""
+        self.count = count
+        if not self._bar._dirty:
+            self._bar._changed()
 
     def format_chunk(self, width):
-        return termcolor.colored(
-            self.symbol * width,
-            self.color,
-            self.on_color,
-            self.attrs
-        )
+        style = self._style
+        return style.prefix + _repeat_symbol(style.symbol, width) + \
+            style.suffix
 
     def format_chunk_summary(self):
-        return termcolor.colored(
-            "{count}".format(count=self.count),
-            self.color,
-            None,
-            self.attrs
-        )
+        style = self._style
+        return style.summary_prefix + format(self.count) + \
+            style.summary_suffix
 
 
 class ProgressBar:
     """Class responsible for showing progress of a task."""
 
+    __slots__ = ('_progress_chunks', '_sep_start', '_sep_end',
+                 '_high_resolution', '_dirty', '_on_dirty',
+                 '_progress_cache', '_summary_cache', '_summary_width_cache')
+
     def __init__(self, sep_start='[', sep_end=']'):
         """Construct a progress bar."""
         self._progress_chunks = []
-        self.sep_start = sep_start
-        self.sep_end = sep_end
+        self._sep_start = sep_start
+        self._sep_end = sep_end
+        self._high_resolution = False
+
+        # Formatted strings are cached until a chunk changes. The invariant
+        # is that the caches are all empty while _dirty is set, so chunk
+        # updates only need to do work on the first change after a format.
+        self._dirty = True
+        self._on_dirty = None
+        self._progress_cache = None
+        self._summary_cache = None
+        self._summary_width_cache = None
+
+    def _changed(self):
+        self._progress_cache = None
+        self._summary_cache = None
+        self._summary_width_cache = None
+        if not self._dirty:
+            self._dirty = True
+            if self._on_dirty is not None:
+                self._on_dirty()
+
+    @property
+    def sep_start(self):
+        """The bracket in front of the progress bar."""
+        return self._sep_start
+
+    @sep_start.setter
+    def sep_start(self, sep_start):
+        self._sep_start = sep_start
+        self._changed()
+
+    @property
+    def sep_end(self):
+        """The bracket after the progress bar."""
+        return self._sep_end
+
+    @sep_end.setter
+    def sep_end(self, sep_end):
+        self._sep_end = sep_end
+        self._changed()
 
     def set_progress_brackets(self, start, end):
         """Set brackets to set around a progress bar."""
-        self.sep_start = start
-        self.sep_end = end
+        self._sep_start = start
+        self._sep_end = end
+        self._changed()
+
+    def set_high_resolution(self, enabled=True):
+        """Draw the bar with eighth-of-a-cell resolution.
+
+        Chunks are still drawn with their symbols, but where one chunk
+        ends inside a cell, the cell is drawn with a Unicode block that
+        fills as many eighths of it as the chunk covers, coloured as the
+        chunk and with the next chunk's colour as background. Chunks
+        with a non-zero count always get at least one eighth.
+        """
+        self._high_resolution = enabled
+        self._changed()
 
     def add_progress(self, count, symbol='#',
                      color=None, on_color=None, attrs=None):
@@ -55,42 +502,50 @@ class ProgressBar:
         character and the foreground and background colours and display style
         determined by the the "color", "on_color" and "attrs" parameters.
         These parameters work as the termcolor.colored function.
+
+        The new chunk is returned and its count can be updated through
+        its increment() and set() methods.
         """
-        chunk = _ProgressChunk(count, symbol, color, on_color, attrs)
+        chunk = _ProgressChunk(count, symbol, color, on_color, attrs, self)
         self._progress_chunks.append(chunk)
+        self._changed()
+        return chunk
 
     def _get_chunk_sizes(self, width):
-
-        # FIXME: using len() here doesn't work with invisible symbols
-        # or things like tabs that take up one character but uses more
-        # space in the terminal.
-        width = width - len(self.sep_start + self.sep_end)
-
+        width = width - display_width(self.sep_start + self.sep_end)
         chunk_counts = [chunk.count for chunk in self._progress_chunks]
-        total = sum(chunk_counts)
-        chunk_real_widths = [chunk/total*width for chunk in chunk_counts]
-        chunk_break_points = \
-            [int(round(bp)) for bp in itertools.accumulate(chunk_real_widths)]
-
-        start_points = [0] + chunk_break_points[:-1]
-        end_points = chunk_break_points
-        chunk_widths = \
-            [(end-start) for (start, end) in zip(start_points, end_points)]
-
-        # assert sum(chunk_widths) == width
-        return chunk_widths
+        return _chunk_sizes(chunk_counts, width)
 
     def format_progress(self, width):
         """Create the formatted string that displays the progress."""
-        chunk_widths = self._get_chunk_sizes(width)
+        cache = self._progress_cache
+        if cache is not None and cache[0] == width:
+            return cache[1]
+        cells = width - display_width(self.sep_start + self.sep_end)
+        if self._high_resolution:
+            return self._cache_progress(
+                width, _format_eighths(self._progress_chunks, cells)
+            )
+        if not sum(chunk.count for chunk in self._progress_chunks):
+            # there is nothing to split the bar between yet.
+            return self._cache_progress(width, " " * max(0, cells))
+        return self._format_chunks(width, self._get_chunk_sizes(width))
+
+    def _format_chunks(self, width, chunk_widths):
         progress_chunks = [chunk.format_chunk(chunk_width)
                            for (chunk, chunk_width)
                            in zip(self._progress_chunks, chunk_widths)]
-        return "{sep_start}{progress}{sep_end}".format(
+        return self._cache_progress(width, "".join(progress_chunks))
+
+    def _cache_progress(self, width, chunks):
+        progress = "{sep_start}{progress}{sep_end}".format(
             sep_start=self.sep_start,
-            progress="".join(progress_chunks),
+            progress=chunks,
             sep_end=self.sep_end
         )
+        self._progress_cache = (width, progress)
+        self._dirty = False
+        return progress
 
     def summary_width(self):
         """Calculate how long a string is needed to show a summary string.
@@ -98,17 +553,26 @@ class ProgressBar:
         This is not simply the length of the formatted summary string
         since that string might contain ANSI codes.
         """
+        if self._summary_width_cache is not None:
+            return self._summary_width_cache
+
         chunk_counts = [chunk.count for chunk in self._progress_chunks]
-        numbers_width = sum(max(1, ceil(log10(count + 1)))
-                            for count in chunk_counts)
+        numbers_width = sum(len(format(count)) for count in chunk_counts)
         separators_with = len(chunk_counts) - 1
-        return numbers_width + separators_with
+        self._summary_width_cache = numbers_width + separators_with
+        self._dirty = False
+        return self._summary_width_cache
 
     def format_summary(self):
         """Generate a summary string for the progress bar."""
+        if self._summary_cache is not None:
+            return self._summary_cache
+
         chunks = [chunk.format_chunk_summary()
                   for chunk in self._progress_chunks]
-        return "/".join(chunks)
+        self._summary_cache = "/".join(chunks)
+        self._dirty = False
+        return self._summary_cache
 
 
 class StatusBar:
@@ -118,17 +582,65 @@ class StatusBar:
     of the progress.
     """
 
+    __slots__ = ('_label', '_fill_char', '_progress', '_indent',
+                 '_rate', '_rate_text', '_on_dirty', '_status_cache')
+
     def __init__(self, label,
                  progress_sep_start='[', progress_sep_end=']', fill_char='.'):
         """Construct a status bar."""
-        self.label = label
-        self.fill_char = fill_char
+        self._label = label
+        self._fill_char = fill_char
         self._progress = ProgressBar(progress_sep_start, progress_sep_end)
 
+        # Lines in groups are indented by their depth in the table.
+        self._indent = ""
+
+        # Estimates of the rate and time left, when they are shown.
+        self._rate = None
+        self._rate_text = None
+
+        # The progress bar only tells us about its first change after it
+        # has been formatted, so we can pass every notification on.
+        self._on_dirty = None
+        self._status_cache = None
+        self._progress._on_dirty = self._changed
+
+    def _changed(self):
+        self._status_cache = None
+        if self._on_dirty is not None:
+            self._on_dirty()
+
+    @property
+    def label(self):
+        """The label shown in front of the progress bar."""
+        return self._label
+
+    @label.setter
+    def label(self, label):
+        self._label = label
+        self._changed()
+
+    @property
+    def fill_char(self):
+        """The character that pads the label to the label width."""
+        return self._fill_char
+
+    @fill_char.setter
+    def fill_char(self, fill_char):
+        self._fill_char = fill_char
+        self._changed()
+
     def set_progress_brackets(self, start, end):
         """Define which braces should be used around the progress bar."""
         self._progress.set_progress_brackets(start, end)
 
+    def set_high_resolution(self, enabled=True):
+        """Draw the progress bar with eighth-of-a-cell resolution.
+
+        See ProgressBar.set_high_resolution.
+        """
+        self._progress.set_high_resolution(enabled)
+
     def add_progress(self, count, symbol='#',
                      color=None, on_color=None, attrs=None):
         """Add a section of progress to the progressbar.
@@ -139,16 +651,50 @@ class StatusBar:
         character and the foreground and background colours and display style
         determined by the the "fg", "bg" and "style" parameters. For these,
         use the colorama package to set up the formatting.
+
+        The new chunk is returned and its count can be updated through
+        its increment() and set() methods.
         """
-        self._progress.add_progress(count, symbol, color, on_color, attrs)
+        return self._progress.add_progress(count, symbol,
+                                           color, on_color, attrs)
+
+    def show_rate(self, chunk=0, eta=True, halflife=5.0):
+        """Show the rate and the estimated time left in the summary.
+
+        The rate is how fast the count of the chunk with index chunk
+        grows, in counts per second, averaged over roughly the last
+        halflife seconds. If eta is true, the summary also shows the time
+        left until the chunk's count reaches the total count of all the
+        chunks, e.g. when a "done" chunk has eaten a "todo" chunk. The
+        estimates are updated when the bar is formatted.
+        """
+        self._rate = _RateEstimator(chunk, eta, halflife)
+        self._rate_text = None
+        self._sample_rate(_clock())
+
+    def _sample_rate(self, now):
+        rate = self._rate
+        chunks = self._progress._progress_chunks
+        if rate.chunk < len(chunks):
+            count = chunks[rate.chunk].count
+            rate.update(now, count)
+        else:
+            count = 0
+        text = rate.format(count, sum(chunk.count for chunk in chunks))
+        if text != self._rate_text:
+            self._rate_text = text
+            self._changed()
 
     def summary_width(self):
         """Get the minimum width the progress summary field will use."""
-        return self._progress.summary_width()
+        width = self._progress.summary_width()
+        if self._rate is not None:
+            width += 1 + self._rate.width()
+        return width
 
     def label_width(self):
         """Get the minimum width the progress label field will use."""
-        return len(self.label)
+        return display_width(self._indent + self.label)
 
     def format_status(self, width=None,
                       label_width=None,
@@ -156,36 +702,108 @@ class StatusBar:
                       summary_width=None):
         """Generate the formatted status bar string."""
         if width is None:  # pragma: no cover
-            width = shutil.get_terminal_size()[0]
+            width = _terminal_size()[0]
+        if self._rate is not None:
+            self._sample_rate(_clock())
 
         if label_width is None:
-            label_width = len(self.label)
+            label_width = self.label_width()
         if summary_width is None:
             summary_width = self.summary_width()
         if progress_width is None:
             progress_width = width - label_width - summary_width - 2
 
-        if len(self.label) > label_width:
-            # FIXME: This actually *will* break if we ever have fewer than
-            # three characters assigned to format the label, but that would
-            # be an extreme situation so I won't fix it just yet.
-            label = self.label[:label_width - 3] + "..."
-        else:
-            label_format = "{{label:{fill_char}<{width}}}".format(
-                width=label_width,
-                fill_char=self.fill_char)
-            label = label_format.format(label=self.label)
+        key = (label_width, progress_width, summary_width)
+        cache = self._status_cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+
+        label = self._indent + self.label
+        if self.label_width() > label_width:
+            # a wide character that does not fit leaves a column to fill.
+            label = truncate(label, label_width)
+        label = pad(label, label_width, self.fill_char)
 
-        summary_format = "{{:>{width}}}".format(width=summary_width)
-        summary = summary_format.format(self._progress.format_summary())
+        # The formatted summary contains ANSI codes, so we pad it from the
+        # width of the visible text rather than from its length.
+        summary_padding = " " * (summary_width - self.summary_width())
+        summary = summary_padding + self._progress.format_summary()
+        if self._rate is not None:
+            summary += " " + self._rate_text
 
         progress = self._progress.format_progress(width=progress_width)
 
-        return "{label} {progress} {summary}".format(
+        status = "{label} {progress} {summary}".format(
             label=label,
             progress=progress,
             summary=summary
         )
+        self._status_cache = (key, status)
+        return status
+
+
+class StatusGroup(StatusBar):
+    """A status table line that sums up a group of lines.
+
+    Groups are created with StatusTable.add_group and lines and nested
+    groups are added to them with add_status_line and add_group. The
+    count of each chunk in a group's progress bar is the sum of the
+    counts of the same chunk in the lines in the group, plus the count
+    the group's chunk was created with. Chunks are added to a group with
+    the style of the first line that has them, unless they were added to
+    the group before that. The lines in a collapsed group are not shown.
+    """
+
+    __slots__ = ('_table', '_index', '_collapsed')
+
+    def __init__(self, table, index, label,
+                 progress_sep_start='[', progress_sep_end=']', fill_char='.'):
+        """Construct a group; use StatusTable.add_group instead."""
+        super().__init__(label, progress_sep_start, progress_sep_end,
+                         fill_char)
+        self._table = table
+        self._index = index
+        self._collapsed = False
+
+    def add_status_line(self, label):
+        """Add a status bar line to the group and return it."""
+        table = self._table
+        status_line = StatusBar(label,
+                                table._sep_start, table._sep_end,
+                                table._fill_char)
+        return table._add_line(status_line, self._index)
+
+    def add_group(self, label):
+        """Add a group nested in this group and return it."""
+        table = self._table
+        group = StatusGroup(table, len(table._lines), label,
+                            table._sep_start, table._sep_end,
+                            table._fill_char)
+        return table._add_line(group, self._index)
+
+    @property
+    def collapsed(self):
+        """Whether the lines in the group are hidden."""
+        return self._collapsed
+
+    @collapsed.setter
+    def collapsed(self, collapsed):
+        if collapsed != self._collapsed:
+            self._collapsed = collapsed
+            self._table._structure_changed()
+
+    def collapse(self):
+        """Hide the lines in the group."""
+        self.collapsed = True
+
+    def expand(self):
+        """Show the lines in the group."""
+        self.collapsed = False
+
+
+# Tables compute the chunk sizes in batches when at least this many lines
+# must be formatted and NumPy is available.
+_BATCH_SIZE = 64
 
 
 class StatusTable:
@@ -200,6 +818,50 @@ class StatusTable:
         self._sep_end = progress_sep_end
         self._fill_char = fill_char
 
+        # Indices of lines that changed since we last looked at them. A line
+        # adds itself here when it goes from clean to dirty, so it can show
+        # up more than once if it was also formatted outside the table.
+        self._dirty_lines = []
+
+        # The label and summary widths of all lines are kept as counted
+        # multisets, so the maximum widths can be updated from the changed
+        # lines alone.
+        self._line_widths = []
+        self._label_widths = collections.Counter()
+        self._summary_widths = collections.Counter()
+
+        # Formatted lines from the last format_table and the indices of
+        # those that need to be formatted again.
+        self._output = None
+        self._output_widths = None
+        self._stale_lines = set()
+
+        # The last field widths calculate_field_widths computed, with the
+        # arguments and maximum widths they were computed from.
+        self._layout = None
+
+        # Render statistics, when they are switched on with enable_stats.
+        self._stats = None
+
+        # Called with the indices of changed lines when the table is
+        # brought up to date, by views that keep their own indices.
+        self._listeners = []
+
+        # Groups: the parent of each line, the lines in each group, and
+        # the counts each line last added to its group. Once there are
+        # groups, the lines are shown in tree order, which is cached
+        # together with the position of each shown line.
+        self._parents = []
+        self._children = {}
+        self._rolled_up = {}
+        self._display = None
+        self._positions = None
+
+        # Lines that show rates and the options new lines get them with.
+        self._rated_lines = []
+        self._rate_options = None
+        self._high_resolution = False
+
     def add_status_line(self, label):
         """Add a status bar line to the table.
 
@@ -209,14 +871,185 @@ class StatusTable:
         status_line = StatusBar(label,
                                 self._sep_start, self._sep_end,
                                 self._fill_char)
-        self._lines.append(status_line)
-        return status_line
+        return self._add_line(status_line, None)
+
+    def add_group(self, label):
+        """Add a group of lines to the table.
+
+        This function returns a StatusGroup that lines can be added to.
+        """
+        group = StatusGroup(self, len(self._lines), label,
+                            self._sep_start, self._sep_end,
+                            self._fill_char)
+        return self._add_line(group, None)
+
+    def _add_line(self, line, parent):
+        index = len(self._lines)
+        line._on_dirty = functools.partial(self._dirty_lines.append, index)
+        self._lines.append(line)
+        self._line_widths.append(None)
+        self._parents.append(parent)
+        if parent is not None:
+            line._indent = self._lines[parent]._indent + "  "
+            self._children[parent].append(index)
+        if isinstance(line, StatusGroup):
+            self._children[index] = []
+        if self._children:
+            self._structure_changed()
+        if self._rate_options is not None:
+            line.show_rate(*self._rate_options)
+            self._rated_lines.append(index)
+        if self._high_resolution:
+            line.set_high_resolution()
+        self._dirty_lines.append(index)
+        return line
+
+    def show_rates(self, chunk=0, eta=True, halflife=5.0):
+        """Show rates and estimated times left on all lines.
+
+        This calls StatusBar.show_rate on the lines in the table and on
+        the lines added later. The estimates are updated every time the
+        table is formatted.
+        """
+        self._rate_options = (chunk, eta, halflife)
+        for line in self._lines:
+            line.show_rate(chunk, eta, halflife)
+        self._rated_lines = list(range(len(self._lines)))
+
+    def row(self, label, total=None, interval=0.1, display=None):
+        """Add a line that counts ok, failed and skipped items.
+
+        Use it as a context manager and call its ok(), fail() and skip()
+        methods; see statusbar.tracking.TrackedRow.
+        """
+        from .tracking import TrackedRow
+        return TrackedRow(self.add_status_line(label), total,
+                          interval, display)
+
+    def set_high_resolution(self, enabled=True):
+        """Draw all bars, also those added later, in high resolution.
+
+        See ProgressBar.set_high_resolution.
+        """
+        self._high_resolution = enabled
+        for line in self._lines:
+            line.set_high_resolution(enabled)
+
+    def enable_stats(self, hook=None):
+        """Start measuring how the table is rendered.
+
+        Returns the statusbar.stats.RenderStats that the frames are
+        recorded in; hook, if given, is called with the numbers of each
+        frame. Without statistics, rendering does not measure anything.
+        """
+        from .stats import RenderStats
+        self._stats = RenderStats(hook)
+        return self._stats
+
+    def disable_stats(self):
+        """Stop measuring how the table is rendered."""
+        self._stats = None
+
+    def stats(self):
+        """Get the render statistics as a dictionary (None if disabled)."""
+        return self._stats.as_dict() if self._stats is not None else None
+
+    def _structure_changed(self):
+        self._display = None
+        self._positions = None
+        self._output = None
+
+    def _display_order(self):
+        """Get the indices of the shown lines, or None without groups."""
+        if not self._children:
+            return None
+        if self._display is None:
+            order = []
+            stack = [i for i, parent in enumerate(self._parents)
+                     if parent is None]
+            stack.reverse()
+            while stack:
+                i = stack.pop()
+                order.append(i)
+                if i in self._children and not self._lines[i].collapsed:
+                    stack.extend(reversed(self._children[i]))
+            self._display = order
+            self._positions = {i: pos for pos, i in enumerate(order)}
+        return self._display
+
+    def _roll_up(self, indices):
+        """Add the changes in the lines at indices to their groups."""
+        for i in indices:
+            parent = self._parents[i]
+            if parent is None:
+                continue
+            chunks = self._lines[i]._progress._progress_chunks
+            counts = [chunk.count for chunk in chunks]
+            rolled_up = self._rolled_up.get(i, [])
+            if counts == rolled_up:
+                continue
+            group = self._lines[parent]
+            group_chunks = group._progress._progress_chunks
+            for k, count in enumerate(counts):
+                if k >= len(group_chunks):
+                    chunk = chunks[k]
+                    group.add_progress(0, chunk.symbol, chunk.color,
+                                       chunk.on_color, chunk.attrs)
+                delta = count - (rolled_up[k] if k < len(rolled_up) else 0)
+                if delta:
+                    group_chunks[k].increment(delta)
+            self._rolled_up[i] = counts
+            self._dirty_lines.append(parent)
+
+    def _flush(self):
+        """Update the field widths from the lines that changed.
+
+        The listeners added with _add_listener are then called with the
+        set of indices of the changed lines.
+        """
+        if not self._dirty_lines:
+            return
+        changed = set()
+        label_widths = self._label_widths
+        summary_widths = self._summary_widths
+        # Changes in grouped lines are added to their groups, which makes
+        # the groups change, so we keep going until nothing changes.
+        while self._dirty_lines:
+            batch = set(self._dirty_lines)
+            del self._dirty_lines[:]
+            if self._children:
+                self._roll_up(batch)
+            for i in batch:
+                sb = self._lines[i]
+                old = self._line_widths[i]
+                new = (sb.label_width(), sb.summary_width())
+                if old != new:
+                    if old is not None:
+                        label_widths[old[0]] -= 1
+                        if not label_widths[old[0]]:
+                            del label_widths[old[0]]
+                        summary_widths[old[1]] -= 1
+                        if not summary_widths[old[1]]:
+                            del summary_widths[old[1]]
+                    label_widths[new[0]] += 1
+                    summary_widths[new[1]] += 1
+                    self._line_widths[i] = new
+                self._stale_lines.add(i)
+            changed |= batch
+        for listener in self._listeners:
+            listener(changed)
+
+    def _add_listener(self, listener):
+        self._flush()
+        self._listeners.append(listener)
+
+    def _remove_listener(self, listener):
+        self._listeners.remove(listener)
 
     def summary_width(self):
         """Compute the minimum size needed for the summary field."""
-        return max(
-            sb.summary_width() for sb in self._lines
-        )
+        self._flush()
+        return max(self._summary_widths)
 
     def label_width(self):
         """Compute the minimum size needed for the label field.
@@ -224,9 +1057,8 @@ class StatusTable:
         This is the minimum size needed if all labels are shown in full.
         If there is not room on a line to shown them in full they will
         be truncated."""
-        return max(
-            sb.label_width() for sb in self._lines
-        )
+        self._flush()
+        return max(self._label_widths)
 
     def calculate_field_widths(self, width=None,
                                min_label_width=10,
@@ -241,10 +1073,15 @@ class StatusTable:
         for the terminal, then your terminal needs to be wider.
         """
         if width is None:  # pragma: no cover
-            width = shutil.get_terminal_size()[0]
+            width = _terminal_size()[0]
 
         summary_width = self.summary_width()
         label_width = self.label_width()
+        key = (width, min_label_width, min_progress_width,
+               label_width, summary_width)
+        if self._layout is not None and self._layout[0] == key:
+            return self._layout[1]
+
         remaining = width - summary_width - label_width - 2
 
         if remaining >= min_progress_width:
@@ -257,7 +1094,45 @@ class StatusTable:
             else:
                 label_width = min_label_width
 
-        return (label_width, progress_width, summary_width)
+        widths = (label_width, progress_width, summary_width)
+        self._layout = (key, widths)
+        return widths
+
+    def _pending_lines(self, widths):
+        """Get the indices of the lines that must be formatted for widths.
+
+        The field widths must come from calculate_field_widths, which also
+        brings the table up to date with the lines that changed. Lines in
+        collapsed groups are not formatted.
+        """
+        display = self._display_order()
+        if self._output is None or widths != self._output_widths:
+            if display is None:
+                return list(range(len(self._lines)))
+            return sorted(display)
+        if display is None:
+            return sorted(self._stale_lines)
+        return sorted(i for i in self._stale_lines if i in self._positions)
+
+    def _format_progress_batch(self, indices, width):
+        """Format the progress bars of the lines at indices in one batch.
+
+        The bars end up in their caches, so formatting the lines after
+        this will use them.
+        """
+        bars = [self._lines[i]._progress for i in indices]
+        bars = [pb for pb in bars
+                if not pb._high_resolution and (
+                    pb._progress_cache is None
+                    or pb._progress_cache[0] != width)]
+        sizes = _batch_chunk_sizes(
+            [[chunk.count for chunk in pb._progress_chunks] for pb in bars],
+            [width - display_width(pb.sep_start + pb.sep_end)
+             for pb in bars]
+        )
+        for pb, chunk_widths in zip(bars, sizes):
+            if chunk_widths is not None:
+                pb._format_chunks(width, chunk_widths)
 
     def format_table(self, width=None,
                      min_label_width=10, min_progress_width=10):
@@ -267,25 +1142,126 @@ class StatusTable:
         aligned across lines and then returns formatted lines as a list of
         strings.
         """
+        return self.format_table_changes(width, min_label_width,
+                                         min_progress_width)[0]
+
+    def format_table_changes(self, width=None,
+                             min_label_width=10, min_progress_width=10):
+        """Format the table and report which lines changed.
+
+        This works as format_table but returns a pair of the formatted
+        lines and a sorted list of the indices of the lines that were
+        formatted again since the last call. Only lines whose progress
+        changed are formatted, unless the field widths changed, in which
+        case all lines are.
+        """
         # handle the special case of an empty table.
         if len(self._lines) == 0:
-            return []
+            return [], []
 
         if width is None:  # pragma: no cover
-            width = shutil.get_terminal_size()[0]
+            width = _terminal_size()[0]
+
+        if self._rated_lines:
+            now = _clock()
+            for i in self._rated_lines:
+                self._lines[i]._sample_rate(now)
 
-        labelw, progw, summaryw = self.calculate_field_widths(
+        stats = self._stats
+        if stats is not None:
+            clock = stats.clock
+            changes = len(self._dirty_lines)
+            start = clock()
+
+        widths = self.calculate_field_widths(
             width=width,
             min_label_width=min_label_width,
             min_progress_width=min_progress_width
         )
-        output = [
-            sb.format_status(
+        labelw, progw, summaryw = widths
+
+        if stats is not None:
+            layout_done = clock()
+
+        pending = self._pending_lines(widths)
+        if len(pending) >= _BATCH_SIZE and _numpy() is not None:
+            self._format_progress_batch(pending, progw)
+
+        if stats is not None:
+            # the progress bars and summaries are formatted separately so
+            # they can be timed, and the lines below are put together from
+            # what this leaves in their caches.
+            for i in pending:
+                self._lines[i]._progress.format_progress(progw)
+            chunks_done = clock()
+            for i in pending:
+                self._lines[i]._progress.format_summary()
+            summaries_done = clock()
+
+        output = self._output
+        realigned = output is None or widths != self._output_widths
+        if realigned:
+            output = [None] * len(self._lines)
+        else:
+            output.extend([None] * (len(self._lines) - len(output)))
+        for i in pending:
+            output[i] = self._lines[i].format_status(
                 label_width=labelw,
                 progress_width=progw,
                 summary_width=summaryw
             )
-            for sb in self._lines
-        ]
+        self._stale_lines.clear()
+        self._output = output
+        self._output_widths = widths
+
+        if stats is not None:
+            end = clock()
+            stats._record_frame(
+                layout=layout_done - start,
+                chunks=chunks_done - layout_done,
+                summaries=summaries_done - chunks_done,
+                lines=end - summaries_done,
+                frame=end - start,
+                changes=changes,
+                rows=len(pending),
+                bytes=sum(len(output[i].encode()) for i in pending)
+            )
+
+        display = self._display
+        if display is None:
+            return list(output), pending
+        if realigned:
+            changed = list(range(len(display)))
+        else:
+            changed = sorted(self._positions[i] for i in pending)
+        return [output[i] for i in display], changed
+
+
+# The displays are imported the first time they are used, so importing
+# statusbar only loads what formatting status lines needs.
+_LAZY_NAMES = {
+    'CompactStatusTable': 'compact',
+    'LiveDisplay': 'live',
+    'LogDisplay': 'log',
+    'auto_display': 'log',
+    'TableExporter': 'export',
+    'BackgroundDisplay': 'threaded',
+    'TableView': 'view',
+    'track': 'tracking',
+    'TrackedRow': 'tracking',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_NAMES.get(name)
+    if module is None:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name)
+        )
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
 
-        return output
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
@@ -0,0 +1,106 @@
+"""Keep a status table up to date from an asyncio event loop."""
+
+import asyncio
+
+from . import _terminal_size
+from .live import LiveDisplay
+
+
+class AsyncLiveDisplay:
+    """Refresh a live display of a status table from an asyncio task.
+
+    Use it as an asynchronous context manager; while inside the context,
+    a task on the event loop draws the table every interval seconds. The
+    lines that need to be formatted are handled batch_size at a time with
+    the event loop getting control in between, so a large table does not
+    block the loop for long. Frames are written to writer, an
+    asyncio.StreamWriter, if given, and otherwise to stream as in
+    LiveDisplay.
+    """
+
+    def __init__(self, table, stream=None, writer=None, interval=0.1,
+                 width=None, batch_size=256, hide_cursor=True):
+        """Create an asynchronous live display of table."""
+        self.table = table
+        self.writer = writer
+        self.interval = interval
+        self.width = width
+        self.batch_size = batch_size
+        self._display = LiveDisplay(table, stream, max_fps=None,
+                                    width=width, hide_cursor=hide_cursor)
+        self._task = None
+
+    def add_status_line(self, label):
+        """Add a line to the table; see StatusTable.add_status_line."""
+        return self.table.add_status_line(label)
+
+    async def _format_pending(self, width):
+        table = self.table
+        if not table._lines:
+            return
+        widths = table.calculate_field_widths(width=width)
+        # Formatting the lines here leaves them in the lines' caches, so
+        # the final format_table_changes only has to collect them. Other
+        # tasks can change the field widths while we wait, and then all
+        # lines must be formatted again, so we go on until they settle.
+        while True:
+            labelw, progw, summaryw = widths
+            pending = table._pending_lines(widths)
+            for start in range(0, len(pending), self.batch_size):
+                for i in pending[start:start + self.batch_size]:
+                    table._lines[i].format_status(label_width=labelw,
+                                                  progress_width=progw,
+                                                  summary_width=summaryw)
+                await asyncio.sleep(0)
+            new_widths = table.calculate_field_widths(width=width)
+            if new_widths == widths:
+                return
+            widths = new_widths
+
+    async def _write(self, text):
+        if not text:
+            return
+        if self.writer is not None:
+            self.writer.write(text.encode())
+            await self.writer.drain()
+        else:
+            self._display.stream.write(text)
+            self._display.stream.flush()
+
+    async def refresh(self):
+        """Draw the changes to the table since the last frame."""
+        width = self.width
+        if width is None:  # pragma: no cover
+            width = _terminal_size()[0]
+        await self._format_pending(width)
+        lines, changed = self.table.format_table_changes(width=width)
+        display = self._display
+        frame = display._frame(lines, changed)
+        display._last_frame = display._clock()
+        await self._write(frame)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    async def close(self):
+        """Stop refreshing, draw the final table and restore the cursor."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.refresh()
+        if self._display.hide_cursor:
+            await self._write("\x1b[?25h")
+
+    async def __aenter__(self):
+        await self.refresh()
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
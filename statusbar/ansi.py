@@ -0,0 +1,68 @@
+"""ANSI codes for coloured text, without third-party dependencies.
+
+The colour, highlight and attribute names are those of termcolor, and
+text is styled exactly as termcolor.colored styles it. Names that are
+not in these tables are looked up in termcolor, if it is installed, so
+newer termcolor colours still work.
+"""
+
+import os
+
+
+COLORS = {
+    'grey': 30, 'red': 31, 'green': 32, 'yellow': 33,
+    'blue': 34, 'magenta': 35, 'cyan': 36, 'white': 37,
+}
+
+HIGHLIGHTS = {
+    'on_grey': 40, 'on_red': 41, 'on_green': 42, 'on_yellow': 43,
+    'on_blue': 44, 'on_magenta': 45, 'on_cyan': 46, 'on_white': 47,
+}
+
+ATTRIBUTES = {
+    'bold': 1, 'dark': 2, 'underline': 4, 'blink': 5,
+    'reverse': 7, 'concealed': 8,
+}
+
+RESET = '\x1b[0m'
+
+
+def _termcolor_style(color, on_color, attrs):
+    try:
+        import termcolor
+    except ImportError:
+        unknown = [name for name, table
+                   in ((color, COLORS), (on_color, HIGHLIGHTS))
+                   if name is not None and name not in table]
+        unknown += [attr for attr in attrs or () if attr not in ATTRIBUTES]
+        raise KeyError(unknown[0])
+    prefix, suffix = termcolor.colored(
+        "\0", color, on_color, list(attrs) if attrs is not None else None
+    ).split("\0")
+    return prefix, suffix
+
+
+def style(color=None, on_color=None, attrs=None):
+    """Get the codes to put before and after text to style it.
+
+    Returns a pair of strings, a prefix and a suffix. As with termcolor,
+    no codes are used if the ANSI_COLORS_DISABLED environment variable
+    is set.
+    """
+    if os.getenv('ANSI_COLORS_DISABLED') is not None:
+        return "", ""
+    if (color is not None and color not in COLORS) or \
+            (on_color is not None and on_color not in HIGHLIGHTS) or \
+            any(attr not in ATTRIBUTES for attr in attrs or ()):
+        return _termcolor_style(color, on_color, attrs)
+
+    # termcolor wraps the text in the colour, then the highlight, then
+    # each attribute, so the last code added comes first.
+    codes = []
+    if color is not None:
+        codes.append(COLORS[color])
+    if on_color is not None:
+        codes.append(HIGHLIGHTS[on_color])
+    codes.extend(ATTRIBUTES[attr] for attr in attrs or ())
+    prefix = "".join("\x1b[{}m".format(code) for code in reversed(codes))
+    return prefix, RESET
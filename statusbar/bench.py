@@ -0,0 +1,218 @@
+"""Benchmarks for formatting progress bars, status bars and tables.
+
+Run with
+
+    python -m statusbar.bench [--full] [--output results.json]
+                              [--compare baseline.json]
+
+to time the formatting functions over a grid of table sizes, chunks per
+bar, widths and with and without colours. The results are written as
+JSON so runs from different versions can be compared with --compare.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+
+import statusbar
+
+
+QUICK_GRID = {
+    'rows': [1, 100, 1000],
+    'chunks': [1, 4, 16],
+    'width': [40, 120],
+    'colored': [False, True],
+}
+
+FULL_GRID = {
+    'rows': [1, 100, 1000, 10000, 100000],
+    'chunks': [1, 4, 16, 64],
+    'width': [40, 120, 300],
+    'colored': [False, True],
+}
+
+_COLORS = ['green', 'red', 'yellow', 'blue', 'magenta', 'cyan']
+
+
+def _add_chunks(bar, chunks, colored, seed):
+    handles = []
+    for k in range(chunks):
+        color = _COLORS[k % len(_COLORS)] if colored else None
+        handles.append(bar.add_progress((seed * 7 + k * 13) % 100 + 1,
+                                        "#.x-=+"[k % 6], color=color))
+    return handles
+
+
+def _make_table(rows, chunks, colored):
+    table = statusbar.StatusTable()
+    handles = []
+    for i in range(rows):
+        line = table.add_status_line("line {}".format(i))
+        handles.append(_add_chunks(line, chunks, colored, i))
+    return table, handles
+
+
+def _time(func, min_time):
+    """Time func, returning seconds per call and the number of calls."""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    best = None
+    while elapsed < min_time or calls < 3:
+        t0 = time.perf_counter()
+        func()
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return best, calls
+
+
+def _bar_benchmarks(chunks, width, colored):
+    pb = statusbar.ProgressBar()
+    handles = _add_chunks(pb, chunks, colored, 0)
+    sb = statusbar.StatusBar("a status bar")
+    sb_handles = _add_chunks(sb, chunks, colored, 0)
+
+    def touch(chunk):
+        # setting a count marks the bar as changed, so caches are dropped.
+        chunk.set(chunk.count)
+
+    def chunk_sizes():
+        pb._get_chunk_sizes(width)
+
+    def format_progress():
+        touch(handles[0])
+        pb.format_progress(width)
+
+    def format_summary():
+        touch(handles[0])
+        pb.format_summary()
+
+    def format_status():
+        touch(sb_handles[0])
+        sb.format_status(width)
+
+    return [
+        ('chunk_sizes', chunk_sizes),
+        ('format_progress', format_progress),
+        ('format_summary', format_summary),
+        ('format_status', format_status),
+    ]
+
+
+def _table_benchmarks(rows, chunks, width, colored):
+    table, handles = _make_table(rows, chunks, colored)
+    widths = itertools.cycle([width, width + 1])
+    updates = itertools.cycle(range(rows))
+
+    def format_table_full():
+        # a new width realigns the table so every line is formatted.
+        table.format_table(next(widths))
+
+    def format_table_cached():
+        table.format_table(width)
+
+    def update_render():
+        for _ in range(max(1, rows // 100)):
+            handles[next(updates)][0].increment()
+        table.format_table_changes(width)
+
+    return [
+        ('format_table_full', format_table_full),
+        ('format_table_cached', format_table_cached),
+        ('update_render', update_render),
+    ]
+
+
+def run(grid=QUICK_GRID, min_time=0.05, out=sys.stderr):
+    """Run the benchmarks over the parameter grid and return the results.
+
+    Each result is a dictionary with the benchmark name, its parameters,
+    the best time for a call in seconds, and the number of calls made.
+    """
+    results = []
+
+    def record(name, func, **params):
+        seconds, calls = _time(func, min_time)
+        result = dict(benchmark=name, seconds=seconds, calls=calls,
+                      **params)
+        results.append(result)
+        if out is not None:
+            print("{benchmark:<20} {params:<50} {seconds:.3e}s".format(
+                benchmark=name,
+                params=" ".join("{}={}".format(k, v)
+                                for k, v in sorted(params.items())),
+                seconds=seconds), file=out)
+
+    for chunks, width, colored in itertools.product(
+            grid['chunks'], grid['width'], grid['colored']):
+        for name, func in _bar_benchmarks(chunks, width, colored):
+            record(name, func, rows=1, chunks=chunks,
+                   width=width, colored=colored)
+
+    for rows, chunks, width, colored in itertools.product(
+            grid['rows'], grid['chunks'], grid['width'], grid['colored']):
+        for name, func in _table_benchmarks(rows, chunks, width, colored):
+            record(name, func, rows=rows, chunks=chunks,
+                   width=width, colored=colored)
+
+    return results
+
+
+def _key(result):
+    return (result['benchmark'], result['rows'], result['chunks'],
+            result['width'], result['colored'])
+
+
+def compare(baseline, results, out=sys.stdout):
+    """Print how much faster or slower results are than baseline."""
+    old = {_key(r): r['seconds'] for r in baseline}
+    for result in results:
+        key = _key(result)
+        if key not in old:
+            continue
+        ratio = result['seconds'] / old[key]
+        print("{:<20} rows={:<6} chunks={:<3} width={:<4} colored={!s:<5} "
+              "{:.2f}x".format(*key, ratio), file=out)
+
+
+def main(args=None):
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m statusbar.bench",
+        description="Benchmark statusbar formatting."
+    )
+    parser.add_argument("--full", action="store_true",
+                        help="run the full, slow, parameter grid")
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="seconds to spend on each benchmark")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write the results as JSON to FILE")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare with results from an earlier run")
+    parser.add_argument("--quiet", action="store_true",
+                        help="do not print timings while running")
+    options = parser.parse_args(args)
+
+    grid = FULL_GRID if options.full else QUICK_GRID
+    results = run(grid, options.min_time,
+                  out=None if options.quiet else sys.stderr)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=1)
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f)['results'], results)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
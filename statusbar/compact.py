@@ -0,0 +1,283 @@
+"""Status tables that store their lines compactly.
+
+A StatusTable keeps a StatusBar, a ProgressBar and a chunk object per
+chunk for every line, which adds up for tables with hundreds of
+thousands of lines. A CompactStatusTable instead keeps the labels in a
+list and the counts of all lines in one packed array, with the chunk
+styles shared by all lines, and hands out light views of its lines.
+"""
+
+import array
+import collections
+
+from . import (StatusTable, _batch_chunk_sizes, _chunk_style, _repeat_symbol,
+               _terminal_size)
+from .width import display_width, truncate, pad
+
+
+class CompactLine:
+    """A view of a line in a CompactStatusTable.
+
+    Views hold nothing but the table and the line's index, so they can
+    be created whenever they are needed and thrown away.
+    """
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        """Create a view of line index in table."""
+        self._table = table
+        self._index = index
+
+    @property
+    def label(self):
+        """The label shown in front of the progress bar."""
+        return self._table._labels[self._index]
+
+    @label.setter
+    def label(self, label):
+        table = self._table
+        widths = table._label_widths
+        old_width = display_width(table._labels[self._index])
+        widths[old_width] -= 1
+        if not widths[old_width]:
+            del widths[old_width]
+        widths[display_width(label)] += 1
+        table._labels[self._index] = label
+        table._changed(self._index)
+
+    def count(self, chunk):
+        """Get the count of chunk in this line."""
+        table = self._table
+        return table._counts[self._index * len(table._styles) + chunk]
+
+    def counts(self):
+        """Get the counts of all chunks in this line as a list."""
+        table = self._table
+        k = len(table._styles)
+        start = self._index * k
+        return table._counts[start:start + k].tolist()
+
+    def increment(self, chunk, n=1):
+        """Add n to the count of chunk in this line."""
+        table = self._table
+        table._counts[self._index * len(table._styles) + chunk] += n
+        table._changed(self._index)
+
+    def set(self, chunk, count):
+        """Set the count of chunk in this line."""
+        table = self._table
+        table._counts[self._index * len(table._styles) + chunk] = count
+        table._changed(self._index)
+
+
+class CompactStatusTable:
+    """A status table for very many lines with the same chunks.
+
+    The chunks are added to the table with add_progress before any lines
+    are, and every line then has a count for each of them. The counts
+    are kept in an array of 64-bit integers, so a line with four chunks
+    takes up about 50 bytes plus its label. Lines are updated through
+    the CompactLine views that add_status_line and line return.
+
+    Once the table has been formatted, it keeps the formatted lines, so
+    format_table_changes only formats the lines that changed. A line
+    that fills 80 columns takes up a few hundred bytes that way, which
+    is several times what the line itself takes.
+
+    The table formats like a StatusTable, and has its format_table and
+    format_table_changes methods, so it can be shown with a LiveDisplay,
+    but it has no groups or rates.
+    """
+
+    def __init__(self,
+                 progress_sep_start='[', progress_sep_end=']',
+                 fill_char='.'):
+        """Create an empty table."""
+        self._sep_start = progress_sep_start
+        self._sep_end = progress_sep_end
+        self._fill_char = fill_char
+        self._styles = []
+        self._labels = []
+        self._counts = array.array('q')
+
+        # The summary width of each line and the number of lines with
+        # each label and summary width, so the field widths can be found
+        # without looking at every line.
+        self._line_summary_widths = array.array('H')
+        self._label_widths = collections.Counter()
+        self._summary_widths = collections.Counter()
+
+        # Lines whose counts or labels changed since the field widths were
+        # updated, and lines that must be formatted again since the last
+        # time the table was formatted.
+        self._dirty = bytearray()
+        self._dirty_lines = []
+        self._stale_lines = set()
+        self._output = None
+        self._output_widths = None
+        self._layout = None
+
+    def add_progress(self, symbol='#', color=None, on_color=None,
+                     attrs=None):
+        """Add a chunk to all lines in the table.
+
+        The style works as in ProgressBar.add_progress. Chunks can only be
+        added while the table has no lines.
+        """
+        if self._labels:
+            raise ValueError(
+                "Chunks must be added before lines are added to the table."
+            )
+        self._styles.append(_chunk_style(symbol, color, on_color, attrs))
+
+    def __len__(self):
+        """Get the number of lines in the table."""
+        return len(self._labels)
+
+    def add_status_line(self, label, counts=None):
+        """Add a line with the given chunk counts (default zero)."""
+        k = len(self._styles)
+        counts = list(counts) if counts is not None else []
+        if len(counts) > k:
+            raise ValueError(
+                "The table only has {} chunks.".format(k)
+            )
+        counts.extend([0] * (k - len(counts)))
+        index = len(self._labels)
+        self._labels.append(label)
+        self._counts.extend(counts)
+        self._dirty.append(0)
+        summary_width = self._summary_width(counts)
+        self._line_summary_widths.append(summary_width)
+        self._summary_widths[summary_width] += 1
+        self._label_widths[display_width(label)] += 1
+        return CompactLine(self, index)
+
+    def line(self, index):
+        """Get a view of the line at index."""
+        if not 0 <= index < len(self._labels):
+            raise IndexError("line index out of range")
+        return CompactLine(self, index)
+
+    def _changed(self, index):
+        if not self._dirty[index]:
+            self._dirty[index] = 1
+            self._dirty_lines.append(index)
+
+    def _row(self, index):
+        k = len(self._styles)
+        return self._counts[index * k:(index + 1) * k].tolist()
+
+    @staticmethod
+    def _summary_width(counts):
+        return max(0, sum(len(str(count)) for count in counts) +
+                   len(counts) - 1)
+
+    def _flush(self):
+        """Update the field widths from the lines that changed."""
+        widths = self._summary_widths
+        line_widths = self._line_summary_widths
+        for i in self._dirty_lines:
+            self._dirty[i] = 0
+            old = line_widths[i]
+            new = self._summary_width(self._row(i))
+            if new != old:
+                widths[old] -= 1
+                if not widths[old]:
+                    del widths[old]
+                widths[new] += 1
+                line_widths[i] = new
+            self._stale_lines.add(i)
+        self._dirty_lines.clear()
+
+    def summary_width(self):
+        """Compute the minimum size needed for the summary field."""
+        self._flush()
+        return max(self._summary_widths)
+
+    def label_width(self):
+        """Compute the minimum size needed for the label field."""
+        self._flush()
+        return max(self._label_widths)
+
+    # The fields are laid out exactly as in a StatusTable.
+    calculate_field_widths = StatusTable.calculate_field_widths
+
+    def _format_line(self, index, label_width, progress_width,
+                     summary_width, chunk_widths):
+        label = self._labels[index]
+        if display_width(label) > label_width:
+            # a wide character that does not fit leaves a column to fill.
+            label = truncate(label, label_width)
+        label = pad(label, label_width, self._fill_char)
+
+        if chunk_widths is None:
+            # there is nothing to split the bar between.
+            bar_width = progress_width - \
+                display_width(self._sep_start + self._sep_end)
+            chunks = " " * max(0, bar_width)
+        else:
+            chunks = "".join(
+                style.prefix + _repeat_symbol(style.symbol, width) +
+                style.suffix
+                for style, width in zip(self._styles, chunk_widths)
+            )
+        progress = self._sep_start + chunks + self._sep_end
+
+        counts = self._row(index)
+        summary = " " * (summary_width - self._line_summary_widths[index]) + \
+            "/".join(style.summary_prefix + format(count) +
+                     style.summary_suffix
+                     for style, count in zip(self._styles, counts))
+
+        return "{label} {progress} {summary}".format(
+            label=label,
+            progress=progress,
+            summary=summary
+        )
+
+    def format_table(self, width=None,
+                     min_label_width=10, min_progress_width=10):
+        """Format the entire table; see StatusTable.format_table."""
+        return self.format_table_changes(width, min_label_width,
+                                         min_progress_width)[0]
+
+    def format_table_changes(self, width=None,
+                             min_label_width=10, min_progress_width=10):
+        """Format the table and report which lines changed.
+
+        See StatusTable.format_table_changes.
+        """
+        if not self._labels:
+            return [], []
+        if width is None:  # pragma: no cover
+            width = _terminal_size()[0]
+
+        widths = self.calculate_field_widths(
+            width=width,
+            min_label_width=min_label_width,
+            min_progress_width=min_progress_width
+        )
+        labelw, progw, summaryw = widths
+
+        output = self._output
+        n = len(self._labels)
+        if output is None or widths != self._output_widths:
+            output = [None] * n
+            pending = list(range(n))
+        else:
+            pending = sorted(self._stale_lines)
+            pending.extend(range(len(output), n))
+            output.extend([None] * (n - len(output)))
+
+        bar_width = progw - display_width(self._sep_start + self._sep_end)
+        sizes = _batch_chunk_sizes([self._row(i) for i in pending],
+                                   [bar_width] * len(pending))
+        for i, chunk_widths in zip(pending, sizes):
+            output[i] = self._format_line(i, labelw, progw, summaryw,
+                                          chunk_widths)
+        self._stale_lines.clear()
+        self._output = output
+        self._output_widths = widths
+        return list(output), pending
@@ -0,0 +1,356 @@
+"""Show the progress of many programs in one status table.
+
+A StatusServer listens on a Unix datagram socket and shows a table with
+the lines that StatusClient objects in other processes add to it:
+
+    python -m statusbar.daemon /tmp/progress.sock
+
+    client = statusbar.daemon.StatusClient("/tmp/progress.sock")
+    line = client.add_status_line("backup")
+    done = line.add_progress(0, "#", color="green")
+    for item in items:
+        done.increment()
+    client.close()
+
+Clients keep their lines and counts locally and send what changed in
+binary frames at most once every interval seconds, so updating a count
+is cheap and a hot loop only sends a few datagrams a second.
+"""
+
+import argparse
+import os
+import random
+import select
+import socket
+import struct
+
+import statusbar
+from .tracking import _next_batch
+
+
+# A frame is a header followed by records. The header identifies the
+# client, by its process id and a random number, so clients need no
+# connection and the server never has to answer.
+_MAGIC = b'SB\x01'
+_HEADER = struct.Struct('<3sII')
+# Each record starts with its kind, a line, a chunk and a count, and line
+# records go on with the label and chunk records with the symbol, colour,
+# background colour and comma-separated attributes of the chunk.
+_LINE = 1
+_CHUNK = 2
+_COUNT = 3
+_RECORD = struct.Struct('<BIHq')
+_STRING = struct.Struct('<H')
+
+# Frames are kept below this size, so they fit in a datagram.
+_MAX_FRAME = 16384
+# Labels and styles are cut to this many bytes, so every record fits in
+# a frame.
+_MAX_STRING = 1024
+
+
+def _pack_string(text):
+    data = (text or "").encode('utf-8')
+    if len(data) > _MAX_STRING:
+        # cut between whole characters.
+        data = data[:_MAX_STRING].decode('utf-8', 'ignore').encode('utf-8')
+    return _STRING.pack(len(data)) + data
+
+
+def _unpack_string(data, offset):
+    size, = _STRING.unpack_from(data, offset)
+    offset += _STRING.size
+    if offset + size > len(data):
+        raise ValueError("The string goes past the end of the frame.")
+    text = data[offset:offset + size].decode('utf-8')
+    return text or None, offset + size
+
+
+def _iter_records(data):
+    """Generate (kind, line, chunk, count, strings) for a frame's records."""
+    offset = _HEADER.size
+    while offset < len(data):
+        kind, line, chunk, count = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        strings = []
+        for _ in range({_LINE: 1, _CHUNK: 4}.get(kind, 0)):
+            text, offset = _unpack_string(data, offset)
+            strings.append(text)
+        yield kind, line, chunk, count, strings
+
+
+class RemoteChunk:
+    """A chunk of a line that a StatusClient sends to a server."""
+
+    __slots__ = ('_client', '_line', '_index', 'count', '_dirty')
+
+    def __init__(self, client, line, index, count):
+        self._client = client
+        self._line = line
+        self._index = index
+        self.count = count
+        self._dirty = False
+
+    def increment(self, n=1):
+        """Add n to the count of this chunk."""
+        self.count += n
+        if not self._dirty:
+            self._dirty = True
+            self._client._dirty_chunks.append(self)
+        self._client._changed()
+
+    def set(self, count):
+        """Set the count of this chunk."""
+        self.count = count
+        if not self._dirty:
+            self._dirty = True
+            self._client._dirty_chunks.append(self)
+        self._client._changed()
+
+
+class RemoteLine:
+    """A line that a StatusClient shows in the server's table."""
+
+    __slots__ = ('_client', '_index', '_chunks')
+
+    def __init__(self, client, index):
+        self._client = client
+        self._index = index
+        self._chunks = 0
+
+    def add_progress(self, count, symbol='#',
+                     color=None, on_color=None, attrs=None):
+        """Add a chunk to the line; see StatusBar.add_progress."""
+        chunk = RemoteChunk(self._client, self._index, self._chunks, count)
+        self._client._records.append(
+            _RECORD.pack(_CHUNK, self._index, self._chunks, count) +
+            _pack_string(symbol) + _pack_string(color) +
+            _pack_string(on_color) +
+            _pack_string(",".join(attrs) if attrs else None)
+        )
+        self._chunks += 1
+        self._client._changed()
+        return chunk
+
+
+class StatusClient:
+    """Send status lines to a StatusServer listening at path.
+
+    Lines and chunks are created and updated as in a StatusTable, and
+    the changes are sent when interval seconds have passed since the
+    last frame, which is checked every so many updates, and when flush()
+    or close() is called. If the server is not running, or its queue is
+    full, the changes are kept and sent with the next frame that gets
+    through.
+    """
+
+    def __init__(self, path, interval=0.25):
+        """Create a client for the server listening at path."""
+        self.path = path
+        self.interval = interval
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # a server that falls behind must not block the client, so frames
+        # that do not fit in its queue fail and are sent again later.
+        self._socket.setblocking(False)
+        self._header = _HEADER.pack(_MAGIC, os.getpid(),
+                                    random.getrandbits(32))
+        self._lines = 0
+        self._records = []
+        self._dirty_chunks = []
+        self._countdown = self._batch = 1
+        self._last_send = self._last_check = statusbar._clock()
+
+    def add_status_line(self, label):
+        """Add a line to the server's table and return it."""
+        line = RemoteLine(self, self._lines)
+        self._records.append(_RECORD.pack(_LINE, self._lines, 0, 0) +
+                             _pack_string(label))
+        self._lines += 1
+        self._changed()
+        return line
+
+    def _changed(self):
+        self._countdown -= 1
+        if self._countdown:
+            return
+        now = statusbar._clock()
+        self._batch = _next_batch(self._batch, now - self._last_check,
+                                  self.interval)
+        self._countdown = self._batch
+        self._last_check = now
+        if now - self._last_send >= self.interval:
+            self.flush()
+
+    def _frames(self, records):
+        """Pack records into frames, yielding each with its record count."""
+        frame = [self._header]
+        size = len(self._header)
+        for record in records:
+            if size + len(record) > _MAX_FRAME:
+                yield b''.join(frame), len(frame) - 1
+                frame, size = [self._header], len(self._header)
+            frame.append(record)
+            size += len(record)
+        if len(frame) > 1:
+            yield b''.join(frame), len(frame) - 1
+
+    def flush(self):
+        """Send the changes that have not been sent yet.
+
+        Returns whether they were sent.
+        """
+        self._last_send = statusbar._clock()
+        chunks = self._dirty_chunks
+        self._dirty_chunks = []
+        records = self._records
+        for chunk in chunks:
+            chunk._dirty = False
+            records.append(_RECORD.pack(_COUNT, chunk._line, chunk._index,
+                                        chunk.count))
+        structure = len(records) - len(chunks)
+        sent = 0
+        try:
+            for frame, count in self._frames(records):
+                self._socket.sendto(frame, self.path)
+                sent += count
+        except OSError:
+            # the lines and chunks that did not get through are sent again
+            # later, and the counts are sent from the chunks then.
+            self._records = records[sent:structure]
+            for chunk in chunks[max(0, sent - structure):]:
+                chunk._dirty = True
+                self._dirty_chunks.append(chunk)
+            return False
+        finally:
+            del records[structure:]
+        self._records = []
+        return True
+
+    def close(self):
+        """Send the last changes and close the socket."""
+        self.flush()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StatusServer:
+    """Show the lines of StatusClient objects in one status table.
+
+    The server binds a Unix datagram socket at path, and each frame it
+    receives adds lines and chunks to table, or sets their counts. The
+    table is shown with display, by default statusbar.auto_display on
+    stdout, and refreshed after the frames that poll() receives.
+    """
+
+    def __init__(self, path, table=None, display=None):
+        """Listen at path; the socket file must not exist."""
+        self.path = path
+        self.table = statusbar.StatusTable() if table is None else table
+        self.display = statusbar.auto_display(self.table) \
+            if display is None else display
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(path)
+        self._lines = {}
+        self._chunks = {}
+
+    def handle_frame(self, data):
+        """Apply the records in a frame to the table.
+
+        Any process can send to the socket, so frames that cannot be read
+        are dropped, and so are chunks with styles that are not known.
+        """
+        if len(data) < _HEADER.size:
+            return
+        magic, pid, nonce = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            return
+        client = (pid, nonce)
+        try:
+            records = list(_iter_records(data))
+        except (struct.error, ValueError):
+            return
+        for kind, line, chunk, count, strings in records:
+            key = (client, line)
+            if kind == _LINE:
+                if key not in self._lines:
+                    self._lines[key] = self.table.add_status_line(strings[0])
+            elif kind == _CHUNK:
+                status_line = self._lines.get(key)
+                if status_line is not None and \
+                        (key, chunk) not in self._chunks:
+                    symbol, color, on_color, attrs = strings
+                    try:
+                        self._chunks[key, chunk] = status_line.add_progress(
+                            count, symbol or ' ', color, on_color,
+                            attrs.split(",") if attrs else None
+                        )
+                    except KeyError:
+                        continue
+            elif kind == _COUNT:
+                progress_chunk = self._chunks.get((key, chunk))
+                if progress_chunk is not None and \
+                        progress_chunk.count != count:
+                    progress_chunk.set(count)
+
+    def poll(self, timeout=None):
+        """Apply the frames that arrive within timeout seconds.
+
+        Waits for the first frame for up to timeout seconds (forever if
+        None), applies every frame that has arrived, and refreshes the
+        display. Returns the number of frames.
+        """
+        frames = 0
+        ready, _, _ = select.select([self._socket], [], [], timeout)
+        while ready:
+            self.handle_frame(self._socket.recv(65536))
+            frames += 1
+            ready, _, _ = select.select([self._socket], [], [], 0)
+        if frames:
+            self.display.refresh()
+        return frames
+
+    def serve_forever(self, interval=0.1):
+        """Apply frames and refresh the display until interrupted."""
+        try:
+            while True:
+                self.poll(interval)
+        except KeyboardInterrupt:
+            pass
+
+    def close(self):
+        """Stop listening and remove the socket file."""
+        self._socket.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:  # pragma: no cover
+            pass
+        close = getattr(self.display, 'close', None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main(args=None):  # pragma: no cover
+    """Run a server from the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m statusbar.daemon",
+        description="Show the progress that other programs send."
+    )
+    parser.add_argument("path", help="the Unix socket to listen at")
+    options = parser.parse_args(args)
+    with StatusServer(options.path) as server:
+        server.serve_forever()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,183 @@
+"""Export the counts in a status table as JSON or Prometheus metrics."""
+
+import json
+import threading
+
+
+# Records are written in batches of this many lines, so huge tables are
+# streamed without building the whole document in memory.
+_WRITE_BATCH = 1000
+
+
+def _chunk_record(chunk):
+    return {
+        'count': chunk.count,
+        'symbol': chunk.symbol,
+        'color': chunk.color,
+        'on_color': chunk.on_color,
+        'attrs': list(chunk.attrs) if chunk.attrs is not None else None,
+    }
+
+
+def _line_record(index, line):
+    return {
+        'line': index,
+        'label': line.label,
+        'chunks': [_chunk_record(chunk)
+                   for chunk in line._progress._progress_chunks],
+    }
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _metric_labels(**labels):
+    return ",".join(
+        '{}="{}"'.format(name, _escape_label_value(str(value)))
+        for name, value in labels.items() if value is not None
+    )
+
+
+class TableExporter:
+    """Serialize the state of a status table for machines to read.
+
+    The exporter keeps a snapshot of the table, a record for each line
+    with its label and the count, symbol and colours of each chunk, and
+    update() refreshes the records of the lines that changed since the
+    last update. The iter_json and iter_prometheus methods, and the HTTP
+    server from serve(), only read the latest snapshot and never touch
+    the table, so scrapes do not compete with the code that updates and
+    renders it, and call update() from that code (for example after each
+    frame) to publish new counts.
+    """
+
+    def __init__(self, table, prefix="statusbar"):
+        """Create an exporter for table with metric names from prefix."""
+        self.table = table
+        self.prefix = prefix
+        self._records = []
+        self._snapshot = ()
+        self._pending = set()
+        self._server = None
+        table._add_listener(self._lines_changed)
+        self._lines_changed(range(len(table._lines)))
+        self.update()
+
+    def _lines_changed(self, indices):
+        self._pending.update(indices)
+
+    def update(self):
+        """Update the snapshot with the lines that changed."""
+        self.table._flush()
+        lines = self.table._lines
+        records = self._records
+        if len(records) < len(lines):
+            records.extend([None] * (len(lines) - len(records)))
+        for i in self._pending:
+            records[i] = _line_record(i, lines[i])
+        self._pending.clear()
+        # Readers hold on to the old tuple, so it is replaced, not changed.
+        self._snapshot = tuple(records)
+
+    def snapshot(self):
+        """Get the records of the lines from the last update."""
+        return self._snapshot
+
+    def iter_json(self):
+        """Generate the JSON document for the snapshot in pieces."""
+        records = self._snapshot
+        yield '{"lines": ['
+        for start in range(0, len(records), _WRITE_BATCH):
+            batch = records[start:start + _WRITE_BATCH]
+            yield (", " if start else "") + \
+                ", ".join(json.dumps(record) for record in batch)
+        yield ']}\n'
+
+    def iter_prometheus(self):
+        """Generate the Prometheus text exposition of the snapshot."""
+        records = self._snapshot
+        lines_metric = self.prefix + "_lines"
+        count_metric = self.prefix + "_chunk_count"
+        yield "# HELP {} Number of lines in the status table.\n" \
+            "# TYPE {} gauge\n" \
+            "{} {}\n".format(lines_metric, lines_metric,
+                             lines_metric, len(records))
+        yield "# HELP {} Count of a chunk in a status line.\n" \
+            "# TYPE {} gauge\n".format(count_metric, count_metric)
+        for start in range(0, len(records), _WRITE_BATCH):
+            out = []
+            for record in records[start:start + _WRITE_BATCH]:
+                for k, chunk in enumerate(record['chunks']):
+                    out.append("{}{{{}}} {}\n".format(
+                        count_metric,
+                        _metric_labels(line=record['line'],
+                                       label=record['label'],
+                                       chunk=k,
+                                       symbol=chunk['symbol'],
+                                       color=chunk['color']),
+                        chunk['count']))
+            yield "".join(out)
+
+    def write_json(self, stream):
+        """Write the snapshot as JSON to stream."""
+        for piece in self.iter_json():
+            stream.write(piece)
+
+    def write_prometheus(self, stream):
+        """Write the snapshot in the Prometheus text format to stream."""
+        for piece in self.iter_prometheus():
+            stream.write(piece)
+
+    def serve(self, port=0, host="127.0.0.1"):
+        """Serve the snapshot over HTTP from a background thread.
+
+        The Prometheus format is served at /metrics and JSON at /json.
+        Returns the (host, port) the server listens on; with port=0 a free
+        port is chosen.
+        """
+        import http.server
+
+        exporter = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    pieces = exporter.iter_prometheus()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/json":
+                    pieces = exporter.iter_json()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 content_type + "; charset=utf-8")
+                self.end_headers()
+                for piece in pieces:
+                    self.wfile.write(piece.encode("utf-8"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        return self._server.server_address[:2]
+
+    def close(self):
+        """Stop the HTTP server and stop following the table."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.table._remove_listener(self._lines_changed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
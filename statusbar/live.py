@@ -0,0 +1,151 @@
+"""Keep a status table up to date on a terminal."""
+
+import sys
+import time
+
+from .width import TAB_SIZE, _units
+
+
+_RESET = "\x1b[0m"
+
+
+def _resume_point(old, new):
+    """Find where to start rewriting a line that changed from old to new.
+
+    Returns the index into new and the terminal column of the last point
+    before the first difference where we are not inside an ANSI escape
+    sequence or a coloured section, so writing from there reproduces the
+    same attributes as writing the full line.
+    """
+    limit = min(len(old), len(new))
+    diff = 0
+    while diff < limit and old[diff] == new[diff]:
+        diff += 1
+
+    # we step over whole characters and escape sequences, counting the
+    # columns they take up, so wide characters are skipped correctly.
+    safe_index = safe_column = 0
+    i = column = 0
+    styled = False
+    for unit, width, is_escape in _units(new):
+        i += len(unit)
+        if i > diff:
+            break
+        if is_escape:
+            styled = unit != _RESET
+        elif width is None:
+            column += TAB_SIZE - column % TAB_SIZE
+        else:
+            column += width
+        if not styled:
+            safe_index, safe_column = i, column
+    return safe_index, safe_column
+
+
+class LiveDisplay:
+    """Show a status table on a terminal and keep it up to date.
+
+    The display owns the lines below the cursor where it first draws the
+    table. Each refresh moves the cursor to the lines that changed since
+    the last frame and rewrites only the part of them that differs, and
+    the frame is written with a single write() on the stream. Refreshes
+    that come faster than max_fps are skipped, so the display can be
+    refreshed on every update.
+    """
+
+    def __init__(self, table, stream=None, max_fps=10,
+                 width=None, hide_cursor=True):
+        """Create a live display of table on stream (default stdout)."""
+        self.table = table
+        self.stream = sys.stdout if stream is None else stream
+        self.width = width
+        self.hide_cursor = hide_cursor
+        self.set_max_fps(max_fps)
+
+        self._shown = []
+        self._last_frame = None
+        self._coalesced = 0
+        self._clock = time.monotonic
+
+    def set_max_fps(self, max_fps):
+        """Set the maximum number of frames per second (None for no limit)."""
+        self._min_interval = 1.0 / max_fps if max_fps else 0.0
+
+    def _frame(self, lines, changed):
+        shown = self._shown
+        out = []
+        if self.hide_cursor and self._last_frame is None:
+            out.append("\x1b[?25l")
+
+        # The cursor starts at the beginning of the line below the table.
+        row = len(shown)
+        for i in changed:
+            if i >= len(shown) or i >= len(lines):
+                break
+            old, new = shown[i], lines[i]
+            if old == new:
+                continue
+            start, column = _resume_point(old, new)
+            if row > i:
+                out.append("\x1b[{}A".format(row - i))
+            elif row < i:
+                out.append("\x1b[{}B".format(i - row))
+            out.append("\x1b[{}G".format(column + 1))
+            out.append(new[start:])
+            out.append("\x1b[K")
+            row = i
+            shown[i] = new
+        if len(lines) < len(shown):
+            # lines were hidden, so we clear the lines below the table.
+            if row > len(lines):
+                out.append("\x1b[{}A".format(row - len(lines)))
+            elif row < len(lines):
+                out.append("\x1b[{}B".format(len(lines) - row))
+            out.append("\r\x1b[J")
+            del shown[len(lines):]
+        elif row < len(shown):
+            out.append("\x1b[{}B\r".format(len(shown) - row))
+        for line in lines[len(shown):]:
+            out.append(line)
+            out.append("\n")
+            shown.append(line)
+        return "".join(out)
+
+    def refresh(self, force=False):
+        """Draw the changes to the table since the last frame.
+
+        Unless force is true, nothing is drawn if the previous frame was
+        drawn less than 1/max_fps seconds ago. Returns whether a frame was
+        drawn.
+        """
+        now = self._clock()
+        if not force and self._last_frame is not None and \
+                now - self._last_frame < self._min_interval:
+            self._coalesced += 1
+            return False
+
+        lines, changed = self.table.format_table_changes(width=self.width)
+        frame = self._frame(lines, changed)
+        stats = getattr(self.table, '_stats', None)
+        if stats is not None:
+            stats._record_write(len(frame.encode()), self._coalesced)
+        self._last_frame = now
+        self._coalesced = 0
+        if frame:
+            self.stream.write(frame)
+            self.stream.flush()
+        return True
+
+    def close(self):
+        """Draw the final state of the table and restore the cursor."""
+        self.refresh(force=True)
+        if self.hide_cursor:
+            self.stream.write("\x1b[?25h")
+            self.stream.flush()
+
+    def __enter__(self):
+        self.refresh(force=True)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
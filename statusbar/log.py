@@ -0,0 +1,136 @@
+"""Report the progress in a status table as log lines."""
+
+import json
+import sys
+import time
+
+import statusbar
+from .live import LiveDisplay
+
+
+# The step of lines that are complete.
+_COMPLETE = -1
+
+
+class LogDisplay:
+    """Write compact snapshots of the lines in a status table to a log.
+
+    This is for streams that are not terminals, such as the output of
+    services and CI jobs. Each snapshot is a single line with the label,
+    counts and percentage of a line in the table, either as text or as
+    a JSON object, and no colours. A line is only written when its
+    percentage, the fraction the count of the chunk with index chunk is
+    of the total, has moved to a new multiple of every_percent, when it
+    first becomes complete, or when it has changed and was last written
+    more than every_seconds ago. The snapshots from a refresh are written
+    with a single write().
+    """
+
+    def __init__(self, table, stream=None, use_json=False, chunk=0,
+                 every_percent=10, every_seconds=60.0):
+        """Create a log of the lines in table on stream (default stdout)."""
+        self.table = table
+        self.stream = sys.stdout if stream is None else stream
+        self.use_json = use_json
+        self.chunk = chunk
+        self.every_percent = every_percent
+        self.every_seconds = every_seconds
+
+        # What we last wrote for each line, and the lines that changed
+        # since then.
+        self._written_counts = []
+        self._written_steps = []
+        self._written_times = []
+        self._pending = set()
+        table._add_listener(self._lines_changed)
+        self._lines_changed(range(len(table._lines)))
+
+    def _lines_changed(self, indices):
+        missing = len(self.table._lines) - len(self._written_counts)
+        if missing > 0:
+            self._written_counts.extend([None] * missing)
+            self._written_steps.extend([None] * missing)
+            self._written_times.extend([None] * missing)
+        self._pending.update(indices)
+
+    def _snapshot(self, index, line, counts, fraction):
+        if self.use_json:
+            return json.dumps({
+                'time': time.time(),
+                'line': index,
+                'label': line.label,
+                'counts': counts,
+                'fraction': fraction,
+            }) + "\n"
+        return "{label}: {counts} ({percent:.0f}%)\n".format(
+            label=line.label,
+            counts="/".join(str(count) for count in counts),
+            percent=100 * fraction
+        )
+
+    def refresh(self, force=False):
+        """Write snapshots of the lines that changed enough.
+
+        With force, all lines that changed since they were last written
+        are written. Returns the number of snapshots written.
+        """
+        self.table._flush()
+        now = statusbar._clock()
+        lines = self.table._lines
+        out = []
+        for i in sorted(self._pending):
+            line = lines[i]
+            counts = [c.count for c in line._progress._progress_chunks]
+            if counts == self._written_counts[i]:
+                self._pending.discard(i)
+                continue
+            total = sum(counts)
+            fraction = counts[self.chunk] / total \
+                if total and self.chunk < len(counts) else 0.0
+            if fraction >= 1.0:
+                # complete lines are a step of their own, so completion is
+                # written once, even for lines that stay complete, such as
+                # rows without a total that have no failures.
+                step = _COMPLETE
+            elif self.every_percent:
+                step = int(100 * fraction // self.every_percent)
+            else:
+                step = None
+            last_time = self._written_times[i]
+            if not (force or last_time is None or
+                    step != self._written_steps[i] or
+                    now - last_time >= self.every_seconds):
+                continue
+            out.append(self._snapshot(i, line, counts, fraction))
+            self._written_counts[i] = counts
+            self._written_steps[i] = step
+            self._written_times[i] = now
+            self._pending.discard(i)
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+        return len(out)
+
+    def close(self):
+        """Write the lines that changed and stop following the table."""
+        self.refresh(force=True)
+        self.table._remove_listener(self._lines_changed)
+
+    def __enter__(self):
+        self.refresh()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def auto_display(table, stream=None, **options):
+    """Get a LiveDisplay on a terminal and a LogDisplay otherwise.
+
+    The options are passed on to the display that is chosen.
+    """
+    stream = sys.stdout if stream is None else stream
+    isatty = getattr(stream, 'isatty', None)
+    if isatty is not None and isatty():
+        return LiveDisplay(table, stream, **options)
+    return LogDisplay(table, stream, **options)
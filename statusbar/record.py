@@ -0,0 +1,368 @@
+"""Record how a status table changes, and replay it later.
+
+A Recorder writes an append-only log of a table: records for new lines
+and chunks, and, each time record() is called, the time and the changes
+to the counts, all as variable-length integers. Every so often it writes
+a keyframe with the whole table, and the time and offset of each
+keyframe go to an index file next to the log, path + ".idx".
+
+A HistoryReader memory-maps the log and the index, and to show the table
+as it was at some time it finds the last keyframe before that time with
+a binary search of the index and replays the records after it, so even
+very long logs are quick to seek in.
+"""
+
+import mmap
+import os
+import struct
+import time
+
+import statusbar
+
+
+_MAGIC = b'SBLOG\x01'
+
+# Record kinds. A line record holds the line's index and label, a chunk
+# record the line, the chunk's index and style, and its count, a time
+# record the microseconds since the last time, and a count record the
+# line, the chunk and how much the count changed. A keyframe holds the
+# absolute time and every line with its label and chunks.
+_LINE = 1
+_CHUNK = 2
+_TIME = 3
+_COUNT = 4
+_KEYFRAME = 5
+
+# Index entries: the time of a keyframe in microseconds and its offset.
+_INDEX_ENTRY = struct.Struct('<QQ')
+
+
+def _put_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _put_signed(out, value):
+    _put_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def _put_string(out, text):
+    if text is None:
+        out.append(0)
+        return
+    data = text.encode('utf-8')
+    _put_varint(out, len(data) + 1)
+    out += data
+
+
+def _get_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _get_signed(data, offset):
+    value, offset = _get_varint(data, offset)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), offset
+
+
+def _get_string(data, offset):
+    size, offset = _get_varint(data, offset)
+    if not size:
+        return None, offset
+    end = offset + size - 1
+    return bytes(data[offset:end]).decode('utf-8'), end
+
+
+def _style(chunk):
+    attrs = chunk.attrs
+    return (chunk.symbol, chunk.color, chunk.on_color,
+            ",".join(attrs) if attrs else None)
+
+
+def _put_style(out, style):
+    for text in style:
+        _put_string(out, text)
+
+
+class Recorder:
+    """Record the changes to a status table in a log file at path.
+
+    Call record() whenever the state should be saved, for example after
+    each frame of a display. Updates to the table cost nothing extra, as
+    the recorder only looks at the lines the table reports as changed.
+    A keyframe is written when the changes since the last one take up
+    more than keyframe_bytes, or more than the last keyframe did, so a
+    seek never replays more than that.
+    """
+
+    def __init__(self, table, path, keyframe_bytes=1 << 16):
+        """Start a new log of table at path."""
+        self.table = table
+        self.path = path
+        self.keyframe_bytes = keyframe_bytes
+        self._clock = time.time
+        self._log = open(path, 'wb')
+        self._index = open(path + '.idx', 'wb')
+        self._log.write(_MAGIC)
+        self._offset = len(_MAGIC)
+
+        # What the log says about each line: its label, and the style and
+        # count of each chunk.
+        self._labels = []
+        self._styles = []
+        self._counts = []
+        self._pending = set()
+        self._time = None
+        self._since_keyframe = 0
+        self._keyframe_size = 0
+        table._add_listener(self._lines_changed)
+        self._lines_changed(range(len(table._lines)))
+
+    def _lines_changed(self, indices):
+        self._pending.update(indices)
+
+    def record(self):
+        """Write the changes to the table since the last record."""
+        self.table._flush()
+        now = int(self._clock() * 1e6)
+        out = bytearray()
+        if self._time is None:
+            self._write_keyframe(out, now)
+        else:
+            out.append(_TIME)
+            _put_varint(out, max(0, now - self._time))
+            self._write_changes(out)
+            self._since_keyframe += len(out)
+            if self._since_keyframe > max(self.keyframe_bytes,
+                                          self._keyframe_size):
+                self._write_keyframe(out, now)
+        self._time = now
+        self._log.write(out)
+        self._offset += len(out)
+        self._log.flush()
+        self._index.flush()
+
+    def _write_changes(self, out):
+        lines = self.table._lines
+        labels, styles, counts = self._labels, self._styles, self._counts
+        for i in sorted(self._pending):
+            line = lines[i]
+            chunks = line._progress._progress_chunks
+            if i == len(labels):
+                labels.append(line.label)
+                styles.append([])
+                counts.append([])
+                out.append(_LINE)
+                _put_varint(out, i)
+                _put_string(out, line.label)
+            elif line.label != labels[i]:
+                labels[i] = line.label
+                out.append(_LINE)
+                _put_varint(out, i)
+                _put_string(out, line.label)
+            line_counts = counts[i]
+            for k, chunk in enumerate(chunks):
+                if k == len(line_counts):
+                    style = _style(chunk)
+                    styles[i].append(style)
+                    line_counts.append(chunk.count)
+                    out.append(_CHUNK)
+                    _put_varint(out, i)
+                    _put_varint(out, k)
+                    _put_style(out, style)
+                    _put_signed(out, chunk.count)
+                elif chunk.count != line_counts[k]:
+                    out.append(_COUNT)
+                    _put_varint(out, i)
+                    _put_varint(out, k)
+                    _put_signed(out, chunk.count - line_counts[k])
+                    line_counts[k] = chunk.count
+        self._pending.clear()
+
+    def _write_keyframe(self, out, now):
+        # bring the recorded state up to date without writing the changes,
+        # since the keyframe holds them all.
+        self._write_changes(bytearray())
+        start = len(out)
+        out.append(_KEYFRAME)
+        _put_varint(out, now)
+        _put_varint(out, len(self._labels))
+        for label, styles, counts in zip(self._labels, self._styles,
+                                         self._counts):
+            _put_string(out, label)
+            _put_varint(out, len(counts))
+            for style, count in zip(styles, counts):
+                _put_style(out, style)
+                _put_signed(out, count)
+        self._index.write(_INDEX_ENTRY.pack(now, self._offset + start))
+        self._keyframe_size = len(out) - start
+        self._since_keyframe = 0
+
+    def close(self):
+        """Record the last changes and close the log."""
+        self.record()
+        self.table._remove_listener(self._lines_changed)
+        self._log.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class HistoryReader:
+    """Read a log written by a Recorder.
+
+    The log and its index are memory-mapped, and table_at() rebuilds the
+    table as it was at any time in the log. Times are seconds since the
+    epoch, as from time.time().
+    """
+
+    def __init__(self, path):
+        """Open the log at path."""
+        self.path = path
+        self._log_file = open(path, 'rb')
+        self._log = mmap.mmap(self._log_file.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+        if self._log[:len(_MAGIC)] != _MAGIC:
+            self._log.close()
+            self._log_file.close()
+            raise ValueError("{} is not a status table log.".format(path))
+        self._index_file = open(path + '.idx', 'rb')
+        size = os.fstat(self._index_file.fileno()).st_size
+        self._index = mmap.mmap(self._index_file.fileno(), 0,
+                                access=mmap.ACCESS_READ) if size else b''
+        # a keyframe may have been indexed but not written when the
+        # recording stopped, so we only use the complete ones.
+        self._keyframes = size // _INDEX_ENTRY.size
+        while self._keyframes and \
+                self._keyframe(self._keyframes - 1)[1] >= len(self._log):
+            self._keyframes -= 1
+
+    def _keyframe(self, i):
+        return _INDEX_ENTRY.unpack_from(self._index, i * _INDEX_ENTRY.size)
+
+    @property
+    def start(self):
+        """The time of the first record in the log (None if empty)."""
+        if not self._keyframes:
+            return None
+        return self._keyframe(0)[0] / 1e6
+
+    def _find_keyframe(self, micros):
+        """Find the last keyframe at or before micros, by binary search."""
+        lo, hi = 0, self._keyframes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._keyframe(mid)[0] <= micros:
+                lo = mid + 1
+            else:
+                hi = mid
+        return max(0, lo - 1)
+
+    def table_at(self, when):
+        """Get a StatusTable with the lines and counts at time when.
+
+        Times before the start of the log give the first recorded table,
+        and lines in groups are shown without their indentation.
+        """
+        table = statusbar.StatusTable()
+        if not self._keyframes:
+            return table
+        micros = int(when * 1e6)
+        now, offset = self._keyframe(self._find_keyframe(micros))
+        data = self._log
+        end = len(data)
+
+        # the keyframe
+        offset += 1
+        now, offset = _get_varint(data, offset)
+        count, offset = _get_varint(data, offset)
+        lines = []
+        chunks = []
+        for _ in range(count):
+            label, offset = _get_string(data, offset)
+            line = table.add_status_line(label)
+            lines.append(line)
+            line_chunks = []
+            chunk_count, offset = _get_varint(data, offset)
+            for _ in range(chunk_count):
+                offset, chunk = _read_chunk(data, offset, line)
+                line_chunks.append(chunk)
+            chunks.append(line_chunks)
+
+        # and the records after it, until we pass the time. The last
+        # record may be cut short if the recording was stopped while it
+        # was written.
+        try:
+            while offset < end:
+                kind = data[offset]
+                offset += 1
+                if kind == _TIME:
+                    delta, offset = _get_varint(data, offset)
+                    now += delta
+                    if now > micros:
+                        break
+                elif kind == _COUNT:
+                    i, offset = _get_varint(data, offset)
+                    k, offset = _get_varint(data, offset)
+                    delta, offset = _get_signed(data, offset)
+                    chunks[i][k].increment(delta)
+                elif kind == _LINE:
+                    i, offset = _get_varint(data, offset)
+                    label, offset = _get_string(data, offset)
+                    if i == len(lines):
+                        lines.append(table.add_status_line(label))
+                        chunks.append([])
+                    else:
+                        lines[i].label = label
+                elif kind == _CHUNK:
+                    i, offset = _get_varint(data, offset)
+                    k, offset = _get_varint(data, offset)
+                    offset, chunk = _read_chunk(data, offset, lines[i])
+                    chunks[i].append(chunk)
+                else:
+                    # a later keyframe comes after a time we have passed,
+                    # so anything else means the log is damaged.
+                    raise ValueError(
+                        "Corrupt log at offset {}.".format(offset - 1)
+                    )
+        except IndexError:
+            pass
+        return table
+
+    def close(self):
+        """Close the log."""
+        if isinstance(self._index, mmap.mmap):
+            self._index.close()
+        self._index_file.close()
+        self._log.close()
+        self._log_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _read_chunk(data, offset, line):
+    symbol, offset = _get_string(data, offset)
+    color, offset = _get_string(data, offset)
+    on_color, offset = _get_string(data, offset)
+    attrs, offset = _get_string(data, offset)
+    count, offset = _get_signed(data, offset)
+    chunk = line.add_progress(count, symbol, color, on_color,
+                              attrs.split(",") if attrs else None)
+    return offset, chunk
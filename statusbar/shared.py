@@ -0,0 +1,161 @@
+"""Status tables whose counts live in shared memory.
+
+This lets worker processes update progress without sending messages to
+the process that shows the table. It requires Python 3.8 or later.
+"""
+
+from multiprocessing import shared_memory
+
+from . import StatusGroup, StatusTable
+
+
+class SharedCounters:
+    """A block of int64 chunk counts, one row per status line.
+
+    Counters can be passed to worker processes, for example as arguments
+    to tasks in a multiprocessing pool, and the workers then attach to the
+    same shared memory block. Updating a count is a plain write to shared
+    memory, so each row should only be updated by one process at a time.
+    """
+
+    def __init__(self, rows, chunks, name=None):
+        """Create a new block of rows x chunks counts, all zero."""
+        self.rows = rows
+        self.chunks = chunks
+        self._owner = name is None
+        if name is None:
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=max(1, rows * chunks * 8)
+            )
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        # new shared memory is zero filled, and the block may be larger
+        # than we asked for, so we only look at the part we need.
+        self._buf = self._shm.buf[:rows * chunks * 8]
+        self._counts = self._buf.cast('q')
+
+    @classmethod
+    def attach(cls, name, rows, chunks):
+        """Attach to the block that another process created."""
+        return cls(rows, chunks, name=name)
+
+    def __reduce__(self):
+        return (SharedCounters.attach, (self.name, self.rows, self.chunks))
+
+    @property
+    def name(self):
+        """The name of the shared memory block."""
+        return self._shm.name
+
+    def increment(self, row, chunk, n=1):
+        """Add n to the count of chunk in row."""
+        self._counts[row * self.chunks + chunk] += n
+
+    def set(self, row, chunk, count):
+        """Set the count of chunk in row."""
+        self._counts[row * self.chunks + chunk] = count
+
+    def count(self, row, chunk):
+        """Get the count of chunk in row."""
+        return self._counts[row * self.chunks + chunk]
+
+    def row_counts(self, row):
+        """Get all the counts in row as a list."""
+        start = row * self.chunks
+        return self._counts[start:start + self.chunks].tolist()
+
+    def _release(self):
+        # the views must go before the shared memory can be closed.
+        if getattr(self, '_counts', None) is None:
+            return False
+        self._counts.release()
+        self._buf.release()
+        self._counts = self._buf = None
+        self._shm.close()
+        return True
+
+    def close(self):
+        """Detach from the block, and remove it if this process made it."""
+        if self._release() and self._owner:
+            self._shm.unlink()
+
+    def __del__(self):
+        self._release()
+
+
+class SharedStatusTable(StatusTable):
+    """A status table backed by a block of shared counts.
+
+    The k'th chunk added to the i'th line gets its count from the counters
+    at row i and chunk k, and the counts are read from shared memory every
+    time the table is formatted. Pass the counters to the processes that
+    make progress and let them update them there. Changes to the chunks in
+    this process, including the count a chunk is created with, are added
+    to the shared counts the next time the table is formatted.
+
+    There can be no more lines, groups included, than the rows in the
+    shared block, and chunks beyond the block's number of chunks are not
+    shared. Groups take up a row, but their counts are the sums of their
+    lines' counts and are not read from the block.
+    """
+
+    def __init__(self, rows, chunks,
+                 progress_sep_start='[', progress_sep_end=']',
+                 fill_char='.'):
+        """Create a table for up to rows lines with chunks chunks each."""
+        super().__init__(progress_sep_start, progress_sep_end, fill_char)
+        self.counters = SharedCounters(rows, chunks)
+        # The counts of each line's chunks when they were last synced, or
+        # None for groups.
+        self._synced = []
+
+    def _add_line(self, line, parent):
+        if len(self._lines) >= self.counters.rows:
+            raise ValueError(
+                "The table only has room for {} lines.".format(
+                    self.counters.rows)
+            )
+        self._synced.append(None if isinstance(line, StatusGroup) else [])
+        return super()._add_line(line, parent)
+
+    def sync(self):
+        """Update the lines with the counts in shared memory.
+
+        What the chunks changed by since the last sync is first added to
+        the shared counts.
+        """
+        counters = self.counters
+        for row, synced in enumerate(self._synced):
+            if synced is None:
+                continue
+            chunks = self._lines[row]._progress._progress_chunks
+            chunks = chunks[:counters.chunks]
+            synced.extend([0] * (len(chunks) - len(synced)))
+            for k, chunk in enumerate(chunks):
+                if chunk.count != synced[k]:
+                    counters.increment(row, k, chunk.count - synced[k])
+            counts = counters.row_counts(row)
+            for k, chunk in enumerate(chunks):
+                if chunk.count != counts[k]:
+                    chunk.set(counts[k])
+                synced[k] = counts[k]
+
+    def format_table_changes(self, width=None,
+                             min_label_width=10, min_progress_width=10):
+        """Read the shared counts and format the table.
+
+        See StatusTable.format_table_changes.
+        """
+        self.sync()
+        return super().format_table_changes(width, min_label_width,
+                                            min_progress_width)
+
+    def close(self):
+        """Release the shared memory block."""
+        self.counters.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,99 @@
+"""Measure where the time goes when status tables are rendered.
+
+Instrumentation is switched on per table with StatusTable.enable_stats,
+and a table without it does no more than check for it once per frame.
+"""
+
+import time
+
+
+class Histogram:
+    """A histogram of values in power-of-two buckets.
+
+    Times are recorded in microseconds, so bucket b holds the values from
+    2**(b-1) up to 2**b, and adding a value costs a few integer operations.
+    """
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        """Create an empty histogram."""
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * 64
+
+    def add(self, value):
+        """Record a non-negative integer value."""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.buckets[min(63, value.bit_length())] += 1
+
+    def as_dict(self):
+        """Get the count, total, mean, maximum and non-empty buckets.
+
+        The buckets map the upper bound of each bucket to its count.
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'buckets': {(1 << b) - 1: n
+                        for b, n in enumerate(self.buckets) if n},
+        }
+
+
+# The phases of a frame that are timed, in microseconds, and the sizes
+# that are counted.
+_TIMES = ('layout', 'chunks', 'summaries', 'lines', 'frame')
+_SIZES = ('changes', 'rows', 'bytes', 'written', 'coalesced')
+
+
+class RenderStats:
+    """Counters and histograms for the frames of a status table.
+
+    For each frame the table records, in microseconds, the time spent
+    on the layout (calculate_field_widths), on formatting the progress
+    chunks and the summaries of the lines that changed, on putting the
+    lines together, and on the whole frame, and it counts the changes to
+    lines since the last frame, the rows formatted and the bytes in
+    them. A LiveDisplay of the table adds the bytes it writes and the
+    refreshes it skipped because they came too fast.
+
+    If a hook is given, it is called after each frame of the table with
+    a dictionary of that frame's numbers.
+    """
+
+    # The clock the phases are timed with.
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, hook=None):
+        """Create empty statistics."""
+        self.hook = hook
+        self.frames = 0
+        self.histograms = {name: Histogram() for name in _TIMES + _SIZES}
+
+    def _record_frame(self, **numbers):
+        # the phases are timed in seconds and recorded in microseconds.
+        for name in _TIMES:
+            numbers[name] = int(numbers[name] * 1e6)
+        self.frames += 1
+        histograms = self.histograms
+        for name, value in numbers.items():
+            histograms[name].add(value)
+        if self.hook is not None:
+            self.hook(numbers)
+
+    def _record_write(self, written, coalesced):
+        self.histograms['written'].add(written)
+        self.histograms['coalesced'].add(coalesced)
+
+    def as_dict(self):
+        """Get the number of frames and each histogram as a dictionary."""
+        stats = {name: histogram.as_dict()
+                 for name, histogram in self.histograms.items()}
+        stats['frames'] = self.frames
+        return stats
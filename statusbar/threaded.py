@@ -0,0 +1,135 @@
+"""Update a status table from many threads and draw it from one."""
+
+import threading
+
+from . import StatusTable, _install_resize_handler
+from .live import LiveDisplay
+
+
+class ShardedCounter:
+    """A chunk count that many threads can increment without locking.
+
+    Each thread adds to its own cell, and the cells are summed into the
+    chunk when the table is drawn. Only the first increment from a thread
+    takes a lock, to register the thread's cell.
+    """
+
+    __slots__ = ('_chunk', '_base', '_local', '_cells', '_lock', '_synced')
+
+    def __init__(self, chunk, lock):
+        self._chunk = chunk
+        self._base = chunk.count
+        self._local = threading.local()
+        self._cells = []
+        self._lock = lock
+        self._synced = chunk.count
+
+    def increment(self, n=1):
+        """Add n to the count."""
+        try:
+            self._local.cell[0] += n
+        except AttributeError:
+            cell = [n]
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+
+    @property
+    def count(self):
+        """The current count, summed over all threads."""
+        return self._base + sum(cell[0] for cell in self._cells)
+
+    def _sync(self):
+        count = self.count
+        if count != self._synced:
+            self._chunk.set(count)
+            self._synced = count
+
+
+class _BackgroundLine:
+    """A line in a BackgroundDisplay."""
+
+    def __init__(self, display, status_line):
+        self._display = display
+        self._status_line = status_line
+
+    def add_progress(self, count, symbol='#',
+                     color=None, on_color=None, attrs=None):
+        """Add a section of progress to the line.
+
+        This works as StatusBar.add_progress but returns a counter that
+        can be incremented from any thread.
+        """
+        display = self._display
+        with display._render_lock:
+            chunk = self._status_line.add_progress(count, symbol,
+                                                   color, on_color, attrs)
+            counter = ShardedCounter(chunk, display._cells_lock)
+            display._counters.append(counter)
+        return counter
+
+
+class BackgroundDisplay:
+    """Draw a status table from a background thread.
+
+    Lines and chunks are added through the display, and the counters
+    returned from add_progress can be incremented from any number of
+    threads. A single thread collects the counts and draws the table with
+    a LiveDisplay every interval seconds. Incrementing a counter never
+    waits for the drawing thread.
+    """
+
+    def __init__(self, table=None, stream=None, interval=0.1, width=None):
+        """Create a display for table (default a new, empty table)."""
+        self.table = StatusTable() if table is None else table
+        self.interval = interval
+        self._display = LiveDisplay(self.table, stream,
+                                    max_fps=None, width=width)
+        if width is None:
+            # the drawing thread looks up the terminal size, but only the
+            # main thread can learn when it changes.
+            _install_resize_handler()
+        self._counters = []
+        self._render_lock = threading.Lock()
+        self._cells_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_status_line(self, label):
+        """Add a line to the table; this is safe from any thread."""
+        with self._render_lock:
+            status_line = self.table.add_status_line(label)
+        return _BackgroundLine(self, status_line)
+
+    def refresh(self):
+        """Collect the counts and draw the table."""
+        with self._render_lock:
+            for counter in self._counters:
+                counter._sync()
+            self._display.refresh(force=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        """Start drawing the table in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and draw the final table."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.refresh()
+        self._display.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,186 @@
+"""Drive status lines from loops with next to no overhead.
+
+    for item in statusbar.track(items, label="items"):
+        ...
+
+    with table.row("jobs", total=len(jobs)) as row:
+        for job in jobs:
+            if run(job):
+                row.ok()
+            else:
+                row.fail()
+
+Counts are collected locally and only added to the line's chunks, and
+the display refreshed, about once every interval seconds. To keep the
+clock out of the loop, it is only read every so many items, and that
+number adapts to how fast the items come.
+"""
+
+import itertools
+import operator
+import sys
+
+import statusbar
+
+
+# The most items between two looks at the clock.
+_MAX_BATCH = 1 << 20
+
+
+def _next_batch(size, elapsed, interval):
+    """Get how many items to handle before looking at the clock again.
+
+    The batch is sized so the next one takes about interval seconds, but
+    it grows at most four times from one batch to the next.
+    """
+    if elapsed <= 0:
+        return min(4 * size, _MAX_BATCH)
+    return max(1, min(4 * size, _MAX_BATCH, int(size * interval / elapsed)))
+
+
+class TrackedRow:
+    """A status line that counts ok, failed and skipped items.
+
+    The line gets a green chunk for ok items, a red one for failed and a
+    yellow one for skipped items, and, if the total is known, a blank
+    chunk for the items that are left. The counts from ok(), fail() and
+    skip() are batched and added to the chunks by flush(), which is
+    called when the row notices interval seconds have passed and when it
+    is used as a context manager and exits. After a flush, display is
+    refreshed, if there is one.
+    """
+
+    __slots__ = ('line', 'interval', 'display',
+                 '_ok', '_failed', '_skipped', '_chunks', '_left',
+                 '_countdown', '_batch', '_last_check')
+
+    def __init__(self, line, total=None, interval=0.1, display=None):
+        """Count items in the status line, line."""
+        self.line = line
+        self.interval = interval
+        self.display = display
+        self._ok = self._failed = self._skipped = 0
+        self._chunks = (
+            line.add_progress(0, "#", color="green"),
+            line.add_progress(0, "x", color="red"),
+            line.add_progress(0, "-", color="yellow"),
+        )
+        self._left = line.add_progress(total, " ") \
+            if total is not None else None
+        self._countdown = self._batch = 1
+        self._last_check = statusbar._clock()
+
+    def ok(self, n=1):
+        """Count n items that went well."""
+        self._ok += n
+        self._countdown -= 1
+        if not self._countdown:
+            self._check_clock()
+
+    def fail(self, n=1):
+        """Count n items that failed."""
+        self._failed += n
+        self._countdown -= 1
+        if not self._countdown:
+            self._check_clock()
+
+    def skip(self, n=1):
+        """Count n items that were skipped."""
+        self._skipped += n
+        self._countdown -= 1
+        if not self._countdown:
+            self._check_clock()
+
+    @property
+    def counts(self):
+        """The numbers of ok, failed and skipped items so far."""
+        return tuple(chunk.count + pending for chunk, pending
+                     in zip(self._chunks,
+                            (self._ok, self._failed, self._skipped)))
+
+    def _check_clock(self):
+        now = statusbar._clock()
+        elapsed = now - self._last_check
+        self._last_check = now
+        self._batch = _next_batch(self._batch, elapsed, self.interval)
+        self._countdown = self._batch
+        self.flush()
+
+    def flush(self):
+        """Add the batched counts to the line and refresh the display."""
+        pending = (self._ok, self._failed, self._skipped)
+        if not any(pending):
+            return
+        self._ok = self._failed = self._skipped = 0
+        for chunk, n in zip(self._chunks, pending):
+            if n:
+                chunk.increment(n)
+        if self._left is not None:
+            self._left.set(max(0, self._left.count - sum(pending)))
+        if self.display is not None:
+            self.display.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+
+def _tracked(iterable, row, on_close):
+    """Yield the items in iterable, counting them as ok in row."""
+    items = iter(iterable)
+    # compress yields the items from C and takes one selector for each
+    # item it yields, so what is left of the selectors tells us how many
+    # items were taken, and the loop runs no Python code per item.
+    size = 1
+    last = statusbar._clock()
+    selectors = None
+    try:
+        while True:
+            selectors = itertools.repeat(True, size)
+            yield from itertools.compress(itertools.islice(items, size),
+                                          selectors)
+            taken = size - operator.length_hint(selectors)
+            row._ok += taken
+            if taken < size:
+                return
+            now = statusbar._clock()
+            size = _next_batch(size, now - last, row.interval)
+            last = now
+            row.flush()
+    except GeneratorExit:
+        # the loop was left early.
+        row._ok += size - operator.length_hint(selectors)
+        raise
+    finally:
+        row.flush()
+        on_close()
+
+
+def track(iterable, table=None, label="", total=None,
+          display=None, interval=0.1):
+    """Iterate over iterable while counting the items in a status line.
+
+    The line is added to table, or, if no table is given, to a new table
+    that is shown on stderr with auto_display until the loop ends. The
+    total defaults to len(iterable), if iterable has a length. The line
+    and the display are updated about every interval seconds.
+    """
+    if total is None:
+        try:
+            total = len(iterable)
+        except TypeError:
+            pass
+    on_close = _nothing
+    if table is None:
+        table = statusbar.StatusTable()
+        if display is None:
+            display = statusbar.auto_display(table, sys.stderr)
+            on_close = display.close
+    row = TrackedRow(table.add_status_line(label), total, interval, display)
+    return _tracked(iterable, row, on_close)
+
+
+def _nothing():
+    pass
@@ -0,0 +1,171 @@
+"""Show a window of a large status table, optionally sorted."""
+
+import bisect
+
+from . import _terminal_size
+
+
+def _label_key(chunk):
+    return lambda line: line.label
+
+
+def _count_key(chunk):
+    def key(line):
+        chunks = line._progress._progress_chunks
+        return chunks[chunk].count if chunk < len(chunks) else 0
+    return key
+
+
+def _fraction_key(chunk):
+    def key(line):
+        chunks = line._progress._progress_chunks
+        total = sum(c.count for c in chunks)
+        if chunk >= len(chunks) or not total:
+            return 0.0
+        return chunks[chunk].count / total
+    return key
+
+
+_SORT_KEYS = {
+    'label': _label_key,
+    'count': _count_key,
+    'fraction': _fraction_key,
+}
+
+
+class TableView:
+    """A scrollable window of the lines in a status table.
+
+    The view shows height lines (by default the height of the terminal)
+    starting at offset. The lines can be sorted by 'label', by the
+    'count' of a chunk, by the 'fraction' of the total count a chunk
+    has, or by any function of the StatusBar objects, and limit
+    restricts the view to the first lines in that order; with
+    sort='fraction' and chunk=0 for a "done" chunk, limit=10 shows the
+    ten least complete lines, and with sort='count', reverse=True and
+    chunk=1 for a "failed" chunk it shows the ten that failed the most.
+
+    The sort order is kept in an index that is updated from the lines
+    that changed, and only the visible lines are formatted, so a frame
+    costs time proportional to the visible lines and the changes rather
+    than to the size of the table.
+
+    A view has a format_table_changes method like StatusTable, so it can
+    be shown with a LiveDisplay.
+    """
+
+    def __init__(self, table, sort=None, chunk=0, reverse=False,
+                 limit=None, height=None, offset=0):
+        """Create a view of table."""
+        self.table = table
+        self.reverse = reverse
+        self.limit = limit
+        self.height = height
+        self.offset = offset
+        self._shown = []
+
+        if sort is None:
+            self._key = None
+        elif callable(sort):
+            self._key = sort
+        else:
+            self._key = _SORT_KEYS[sort](chunk)
+
+        # (key, index) pairs in sorted order and the key of each line.
+        self._order = []
+        self._keys = []
+        table._add_listener(self._lines_changed)
+        self._lines_changed(range(len(table._lines)))
+
+    def close(self):
+        """Stop following the changes to the table."""
+        self.table._remove_listener(self._lines_changed)
+
+    def _lines_changed(self, indices):
+        if self._key is None:
+            return
+        lines = self.table._lines
+        keys = self._keys
+        order = self._order
+        if len(keys) < len(lines):
+            keys.extend([None] * (len(lines) - len(keys)))
+        for i in indices:
+            key = self._key(lines[i])
+            old = keys[i]
+            if old is not None:
+                if old[0] == key:
+                    continue
+                del order[bisect.bisect_left(order, old)]
+            keys[i] = (key, i)
+            bisect.insort(order, keys[i])
+
+    def __len__(self):
+        """Get the number of lines the view can scroll through."""
+        n = len(self.table._lines)
+        return n if self.limit is None else min(n, self.limit)
+
+    def _visible_height(self):
+        if self.height is not None:
+            return self.height
+        return _terminal_size()[1] - 1  # pragma: no cover
+
+    def scroll(self, lines):
+        """Move the window lines down (or up, if lines is negative)."""
+        last = max(0, len(self) - self._visible_height())
+        self.offset = min(max(0, self.offset + lines), last)
+
+    def visible_lines(self):
+        """Get the indices in the table of the lines in the window."""
+        self.table._flush()
+        n = len(self)
+        start = min(self.offset, n)
+        stop = min(start + self._visible_height(), n)
+        if self._key is None:
+            if not self.reverse:
+                return list(range(start, stop))
+            last = len(self.table._lines) - 1
+            return [last - i for i in range(start, stop)]
+        order = self._order
+        if self.reverse:
+            last = len(order) - 1
+            return [order[last - i][1] for i in range(start, stop)]
+        return [order[i][1] for i in range(start, stop)]
+
+    def format_view(self, width=None,
+                    min_label_width=10, min_progress_width=10):
+        """Format the lines in the window.
+
+        The fields are aligned with the whole table, so they do not move
+        when the view is scrolled.
+        """
+        return self.format_table_changes(width, min_label_width,
+                                         min_progress_width)[0]
+
+    def format_table_changes(self, width=None,
+                             min_label_width=10, min_progress_width=10):
+        """Format the lines in the window and report which changed.
+
+        Returns the formatted lines and the positions in the window of the
+        lines that differ from the last call.
+        """
+        table = self.table
+        if not table._lines:
+            return [], []
+        if width is None:  # pragma: no cover
+            width = _terminal_size()[0]
+        labelw, progw, summaryw = table.calculate_field_widths(
+            width=width,
+            min_label_width=min_label_width,
+            min_progress_width=min_progress_width
+        )
+        lines = [
+            table._lines[i].format_status(label_width=labelw,
+                                          progress_width=progw,
+                                          summary_width=summaryw)
+            for i in self.visible_lines()
+        ]
+        shown = self._shown
+        changed = [i for i, line in enumerate(lines)
+                   if i >= len(shown) or shown[i] != line]
+        self._shown = lines
+        return list(lines), changed
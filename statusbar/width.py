@@ -0,0 +1,126 @@
+"""Compute how wide text is when shown in a terminal.
+
+Text is split into units that are shown as a whole: ANSI escape
+sequences, which take no space, and characters together with any
+combining marks, variation selectors and zero-width-joined characters
+that follow them. East Asian wide and full-width characters take two
+columns and tabs move to the next multiple of TAB_SIZE.
+"""
+
+import functools
+import unicodedata
+
+
+TAB_SIZE = 8
+
+_ESCAPE = r'\x1b(?:\[[0-?]*[ -/]*[@-~]|[@-Z\\-_])'
+_escape_pattern = None
+_ZWJ = '\u200d'
+_RESET = '\x1b[0m'
+
+
+def _char_width(char):
+    if unicodedata.combining(char):
+        return 0
+    category = unicodedata.category(char)
+    if category in ('Mn', 'Me', 'Cf', 'Cc'):
+        return 0
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 2
+    return 1
+
+
+def _escape():
+    """Compile the escape sequence pattern the first time it is needed."""
+    # re is slow to import and plain ASCII text never needs it.
+    global _escape_pattern
+    if _escape_pattern is None:
+        import re
+        _escape_pattern = re.compile(_ESCAPE)
+    return _escape_pattern
+
+
+def _units(text):
+    """Split text into (unit, width, is_escape) triples."""
+    units = []
+    i = 0
+    n = len(text)
+    while i < n:
+        char = text[i]
+        if char == '\x1b':
+            match = _escape().match(text, i)
+            end = match.end() if match else i + 1
+            units.append((text[i:end], 0, True))
+            i = end
+            continue
+        if char == '\t':
+            units.append((char, None, False))
+            i += 1
+            continue
+        end = i + 1
+        width = _char_width(char)
+        while end < n:
+            following = text[end]
+            if following == _ZWJ and end + 1 < n:
+                end += 2
+            elif following != '\t' and following != '\x1b' and \
+                    _char_width(following) == 0:
+                end += 1
+            else:
+                break
+        units.append((text[i:end], width, False))
+        i = end
+    return units
+
+
+@functools.lru_cache(maxsize=4096)
+def display_width(text):
+    """Get the number of terminal columns text takes up."""
+    if text.isascii() and text.isprintable():
+        return len(text)
+    column = 0
+    for unit, width, _ in _units(text):
+        if width is None:
+            column += TAB_SIZE - column % TAB_SIZE
+        else:
+            column += width
+    return column
+
+
+def truncate(text, width, ellipsis='...'):
+    """Shorten text to at most width columns, ending it with ellipsis.
+
+    Text that fits is returned unchanged. Otherwise, the text is cut
+    between two whole characters, escape sequences are kept whole, and if
+    any escape sequences were kept the result ends with an ANSI reset.
+    """
+    if display_width(text) <= width:
+        return text
+    ellipsis_width = display_width(ellipsis)
+    if ellipsis_width > width:
+        ellipsis, ellipsis_width = truncate(ellipsis, width, ''), width
+    room = width - ellipsis_width
+
+    kept = []
+    column = 0
+    styled = False
+    for unit, unit_width, is_escape in _units(text):
+        if is_escape:
+            kept.append(unit)
+            styled = True
+            continue
+        if unit_width is None:
+            unit_width = TAB_SIZE - column % TAB_SIZE
+        if column + unit_width > room:
+            break
+        kept.append(unit)
+        column += unit_width
+    kept.append(ellipsis)
+    if styled:
+        kept.append(_RESET)
+    return ''.join(kept)
+
+
+def pad(text, width, fill_char=' '):
+    """Left-justify text in width columns using fill_char."""
+    return text + fill_char * max(0, width - display_width(text))
@@ -1,6 +1,23 @@
+import asyncio
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import multiprocessing
+import threading
 import unittest
 import termcolor
 import statusbar
+import statusbar.aio
+import statusbar.bench
+import statusbar.daemon
+import statusbar.record
+import statusbar.shared
+from statusbar.width import display_width, truncate, pad
 
 
 class TestProgressBar(unittest.TestCase):
@@ -42,6 +59,24 @@ class TestProgressBar(unittest.TestCase):
         breakpoints = pb._get_chunk_sizes(4)
         self.assertListEqual(breakpoints, [1, 3])
 
+    def test_batch_chunk_widths(self):
+        rows = [[1, 1], [1, 2], [1, 2], [1, 3], [1, 3], [0, 0], [5],
+                [3, 0, 7, 11, 2], [1, 1, 1, 1, 1, 1, 1]]
+        widths = [2, 3, 2, 2, 4, 10, 9, 17, 5]
+        expected = [[1, 1], [1, 2], [1, 1], [0, 2], [1, 3], None, [9],
+                    statusbar._chunk_sizes([3, 0, 7, 11, 2], 17),
+                    statusbar._chunk_sizes([1] * 7, 5)]
+
+        saved = statusbar._numpy_module
+        try:
+            for numpy in [saved, False]:
+                statusbar._numpy_module = numpy
+                self.assertEqual(
+                    statusbar._batch_chunk_sizes(rows, widths), expected
+                )
+        finally:
+            statusbar._numpy_module = saved
+
     def test_progress_formatting(self):
         pb = statusbar.ProgressBar()
         pb.add_progress(1, '.')
@@ -78,6 +113,25 @@ class TestProgressBar(unittest.TestCase):
             "[\x1b[4m\x1b[41m\x1b[32m.\x1b[0m\x1b[1m\x1b[42m\x1b[31m##\x1b[0m]"
         )
 
+    def test_compiled_styles(self):
+        styles = [
+            (None, None, None),
+            ("green", None, None),
+            ("red", "on_white", None),
+            (None, "on_blue", ["bold"]),
+            ("cyan", "on_grey", ["underline", "blink"]),
+        ]
+        for color, on_color, attrs in styles:
+            pb = statusbar.ProgressBar()
+            chunk = pb.add_progress(12, "#", color, on_color, attrs)
+            for width in [0, 1, 5]:
+                self.assertEqual(
+                    chunk.format_chunk(width),
+                    termcolor.colored("#" * width, color, on_color, attrs)
+                )
+            self.assertEqual(chunk.format_chunk_summary(),
+                             termcolor.colored("12", color, None, attrs))
+
     def test_summary_string(self):
         pb = statusbar.ProgressBar()
         pb.add_progress(1, '.')
@@ -144,6 +198,63 @@ class TestProgressBar(unittest.TestCase):
         self.assertEqual(summary_string,
                          termcolor.colored("100")+"/"+termcolor.colored("199"))
 
+    def test_chunk_handles(self):
+        pb = statusbar.ProgressBar(sep_start="", sep_end="")
+        dots = pb.add_progress(1, '.')
+        hashes = pb.add_progress(1, '#')
+        self.assertEqual(pb.format_progress(4), "..\x1b[0m##\x1b[0m")
+
+        hashes.increment(2)
+        self.assertEqual(hashes.count, 3)
+        self.assertEqual(pb.format_progress(4), ".\x1b[0m###\x1b[0m")
+        self.assertEqual(pb.format_summary(),
+                         termcolor.colored("1")+"/"+termcolor.colored("3"))
+
+        dots.set(3)
+        hashes.set(1)
+        self.assertEqual(pb.format_progress(4), "...\x1b[0m#\x1b[0m")
+        self.assertEqual(pb.summary_width(), 3)
+
+    def test_high_resolution(self):
+        pb = statusbar.ProgressBar(sep_start="", sep_end="")
+        pb.add_progress(1, '#', color="green")
+        pb.add_progress(3, '.', color="red")
+        pb.set_high_resolution()
+        # [1,3] in width 2 puts the boundary in the middle of the first
+        # cell instead of hiding the first chunk.
+        self.assertEqual(statusbar._eighth_boundaries([1, 3], 2), [4, 16])
+        self.assertEqual(pb.format_progress(2),
+                         termcolor.colored('\u258c', 'green', 'on_red') +
+                         termcolor.colored('.', 'red'))
+
+        # a small chunk gets at least an eighth of a cell, and a cell is
+        # never split between more than two chunks.
+        self.assertEqual(
+            statusbar._eighth_boundaries([1, 1, 1, 1000], 4), [1, 8, 9, 32]
+        )
+        self.assertEqual(
+            statusbar._eighth_boundaries([1, 0, 1000000], 1), [1, 1, 8]
+        )
+
+        # with no room for cells, only the brackets are drawn.
+        pb = statusbar.ProgressBar()
+        pb.add_progress(1, '#', color="green")
+        pb.add_progress(0, '.')
+        pb.set_high_resolution()
+        self.assertEqual(pb.format_progress(2), "[]")
+        self.assertEqual(pb.format_progress(1), "[]")
+
+    def test_high_resolution_table(self):
+        st = statusbar.StatusTable()
+        sb = st.add_status_line("a")
+        sb.add_progress(1, '#')
+        sb.add_progress(99, ' ')
+        st.set_high_resolution()
+        st.add_status_line("b").add_progress(0, '#')
+        lines = st.format_table(30)
+        self.assertTrue(lines[0].startswith("a [\u258e"))
+        self.assertEqual([display_width(line) for line in lines], [30, 30])
+
 
 class TestStatusBar(unittest.TestCase):
     """Test of a status bar."""
@@ -179,7 +290,9 @@ class TestStatusBar(unittest.TestCase):
                                   progress_width=10,
                                   summary_width=5)
 
-        self.assertEqual(len(result), 35)  # this is only to avoid lint issues
+        # 4+1+10+1+5 visible columns and four colour resets, two in the
+        # progress bar and two in the summary.
+        self.assertEqual(len(result), 4 + 1 + 10 + 1 + 5 + 4 * 4)
 
     def test_formatting_with_fill_char(self):
         sb = statusbar.StatusBar("Test", fill_char=' ')
@@ -192,6 +305,206 @@ class TestStatusBar(unittest.TestCase):
         result = sb.format_status(15, label_width=5)
         self.assertTrue(result.startswith('Test_ '))
 
+    def test_cached_status(self):
+        sb = statusbar.StatusBar("Test")
+        done = sb.add_progress(1, '#')
+        sb.add_progress(1, '.')
+        first = sb.format_status(20)
+        self.assertIs(sb.format_status(20), first)
+
+        done.increment()
+        second = sb.format_status(20)
+        self.assertNotEqual(second, first)
+        self.assertIs(sb.format_status(20), second)
+
+        sb.label = "Other"
+        self.assertTrue(sb.format_status(20).startswith("Other"))
+
+        sb.fill_char = "_"
+        self.assertTrue(sb.format_status(20, label_width=8)
+                        .startswith("Other___ "))
+        sb._progress.sep_start = "<"
+        sb._progress.sep_end = ">"
+        self.assertIn(" <", sb.format_status(20))
+        self.assertIn("> ", sb.format_status(20))
+
+        st = statusbar.StatusTable()
+        line = st.add_status_line("a")
+        line.add_progress(1, "#")
+        st.add_status_line("abc").add_progress(1, "#")
+        st.format_table(20)
+        line.fill_char = "_"
+        self.assertTrue(st.format_table(20)[0].startswith("a__ "))
+
+    def test_wide_labels(self):
+        sb = statusbar.StatusBar("日本語", fill_char='.')
+        sb.add_progress(1, '#')
+        self.assertEqual(sb.label_width(), 6)
+        self.assertTrue(sb.format_status(20, label_width=8)
+                        .startswith("日本語.. "))
+        self.assertTrue(sb.format_status(20, label_width=5)
+                        .startswith("日... "))
+
+        sb = statusbar.StatusBar(termcolor.colored("red", "red"))
+        sb.add_progress(1, '#')
+        self.assertEqual(sb.label_width(), 3)
+        self.assertTrue(sb.format_status(20, label_width=5)
+                        .startswith(termcolor.colored("red", "red") + ".. "))
+
+        # wide symbols are repeated to fill the same number of columns
+        pb = statusbar.ProgressBar()
+        pb.add_progress(1, '＃')
+        self.assertEqual(pb.format_progress(7), "[＃＃ \x1b[0m]")
+
+
+class TestImport(unittest.TestCase):
+    """Test of what importing statusbar costs."""
+
+    def test_import_is_light(self):
+        code = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import statusbar\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(m for m in ('termcolor', 'shutil', 're', 'json',"
+            " 'threading') if m in sys.modules))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", code], cwd=root,
+                             stdout=subprocess.PIPE, check=True,
+                             universal_newlines=True).stdout.split("\n")
+        self.assertLess(float(out[0]), 0.2)
+        self.assertEqual(out[1], "")
+
+    def test_lazy_names(self):
+        self.assertIn("LiveDisplay", dir(statusbar))
+        self.assertIs(statusbar.TableView, statusbar.view.TableView)
+        with self.assertRaises(AttributeError):
+            statusbar.NoSuchThing
+
+    def test_builtin_colors_match_termcolor(self):
+        from statusbar import ansi
+        for color in [None] + list(ansi.COLORS):
+            for on_color in [None] + list(ansi.HIGHLIGHTS):
+                self.assertEqual(
+                    ansi.style(color, on_color, None),
+                    tuple(termcolor.colored("\0", color, on_color)
+                          .split("\0"))
+                )
+        attrs = list(ansi.ATTRIBUTES)
+        self.assertEqual(
+            ansi.style("red", None, attrs),
+            tuple(termcolor.colored("\0", "red", None, attrs).split("\0"))
+        )
+
+
+class TestTerminalSize(unittest.TestCase):
+    """Test of caching the terminal size and the table layout."""
+
+    def setUp(self):
+        import shutil
+        self.shutil = shutil
+        self.saved = shutil.get_terminal_size
+        self.lookups = 0
+
+        def get_terminal_size():
+            self.lookups += 1
+            return os.terminal_size((40 + self.lookups, 24))
+
+        shutil.get_terminal_size = get_terminal_size
+        statusbar.invalidate_terminal_size()
+
+    def tearDown(self):
+        self.shutil.get_terminal_size = self.saved
+        statusbar.invalidate_terminal_size()
+
+    def test_cached_until_resized(self):
+        st = statusbar.StatusTable()
+        st.add_status_line("a").add_progress(1, "#")
+        for _ in range(3):
+            self.assertEqual(display_width(st.format_table()[0]), 41)
+        self.assertEqual(self.lookups, 1)
+
+        statusbar.invalidate_terminal_size()
+        self.assertEqual(display_width(st.format_table()[0]), 42)
+        self.assertEqual(self.lookups, 2)
+
+    @unittest.skipUnless(hasattr(signal, 'SIGWINCH'), "no SIGWINCH")
+    def test_sigwinch(self):
+        statusbar._terminal_size()
+        os.kill(os.getpid(), signal.SIGWINCH)
+        self.assertEqual(statusbar._terminal_size()[0], 42)
+
+    @unittest.skipUnless(hasattr(signal, 'SIGWINCH'), "no SIGWINCH")
+    def test_lookup_from_thread(self):
+        saved_handler = signal.getsignal(signal.SIGWINCH)
+        saved_installed = statusbar._resize_handler_installed
+        statusbar._resize_handler_installed = False
+        try:
+            sizes = []
+
+            def look_up():
+                sizes.append(statusbar._terminal_size()[0])
+                sizes.append(statusbar._terminal_size()[0])
+
+            thread = threading.Thread(target=look_up)
+            thread.start()
+            thread.join()
+            # no handler could be installed, so nothing was cached.
+            self.assertFalse(statusbar._resize_handler_installed)
+            self.assertEqual(sizes, [41, 42])
+
+            # a background display installs it from the main thread.
+            statusbar.BackgroundDisplay(stream=io.StringIO())
+            self.assertTrue(statusbar._resize_handler_installed)
+            thread = threading.Thread(target=look_up)
+            thread.start()
+            thread.join()
+            self.assertEqual(sizes[2:], [43, 43])
+        finally:
+            signal.signal(signal.SIGWINCH, saved_handler)
+            statusbar._resize_handler_installed = saved_installed
+
+    def test_layout_is_memoized(self):
+        st = statusbar.StatusTable()
+        sb = st.add_status_line("a")
+        chunk = sb.add_progress(1, "#")
+        widths = st.calculate_field_widths(40)
+        self.assertIs(st.calculate_field_widths(40), widths)
+        chunk.set(100)
+        self.assertEqual(st.calculate_field_widths(40), (1, 34, 3))
+        sb.label = "longer"
+        self.assertEqual(st.calculate_field_widths(40), (6, 29, 3))
+
+
+class TestDisplayWidth(unittest.TestCase):
+    """Test of computing the width of text in a terminal."""
+
+    def test_display_width(self):
+        self.assertEqual(display_width("hello"), 5)
+        self.assertEqual(display_width(""), 0)
+        self.assertEqual(display_width("日本"), 4)
+        self.assertEqual(display_width("e\u0301"), 1)
+        self.assertEqual(display_width("\x1b[31mred\x1b[0m"), 3)
+        self.assertEqual(display_width("a\tb"), 9)
+        self.assertEqual(display_width("\U0001F469\u200d\U0001F4BB"), 2)
+
+    def test_truncate(self):
+        self.assertEqual(truncate("hello", 5), "hello")
+        self.assertEqual(truncate("hello world", 8), "hello...")
+        self.assertEqual(truncate("hello", 2), "..")
+        self.assertEqual(truncate("日本語です", 6), "日...")
+        # combining marks stay with their character
+        self.assertEqual(truncate("ae\u0301bcdef", 5), "ae\u0301...")
+        # escape sequences are never cut and styles are reset
+        self.assertEqual(truncate("\x1b[31mhello world\x1b[0m", 8),
+                         "\x1b[31mhello...\x1b[0m")
+
+    def test_pad(self):
+        self.assertEqual(pad("ab", 4, "."), "ab..")
+        self.assertEqual(pad("日本", 6), "日本  ")
+        self.assertEqual(pad("abc", 2), "abc")
+
 
 class TestStatusTable(unittest.TestCase):
     """Test of a status table."""
@@ -241,17 +554,1078 @@ class TestStatusTable(unittest.TestCase):
         sb.add_progress(10, "#")
         sb.add_progress(10, " ")
 
-        st.format_table(width=40)
-        # formatted = st.format_table(width=40)
-        # labelw = len(label2)
-        # statusw = len("10/10")
+        formatted = st.format_table(width=40)
+        labelw = len(label2)
+        # the summaries are padded to the same visible width
+        first_status = termcolor.colored("1") + "/" + termcolor.colored("1")
+        second_status = termcolor.colored("10") + "/" + \
+            termcolor.colored("10")
+
+        self.assertEqual(formatted[0][:labelw], "Test............")
+        self.assertEqual(formatted[1][:labelw], label2)
+        self.assertTrue(formatted[0].endswith(" " * 2 + first_status))
+        self.assertTrue(formatted[1].endswith("] " + second_status))
+
+    def test_incremental_table_formatting(self):
+        st = statusbar.StatusTable()
+        chunks = []
+        for label in ["a", "b", "c"]:
+            sb = st.add_status_line(label)
+            chunks.append(sb.add_progress(1, "#"))
+            sb.add_progress(1, " ")
+
+        first = st.format_table(width=30)
+        self.assertEqual(st.format_table(width=30), first)
+
+        chunks[1].increment()
+        second = st.format_table(width=30)
+        self.assertEqual(second[0], first[0])
+        self.assertNotEqual(second[1], first[1])
+        self.assertEqual(second[2], first[2])
+
+        # a new line is formatted on the next call as well
+        sb = st.add_status_line("d")
+        sb.add_progress(1, "#")
+        sb.add_progress(1, " ")
+        third = st.format_table(width=30)
+        self.assertEqual(len(third), 4)
+        self.assertEqual(third[:3], second)
+
+        # bars formatted from scratch agree with the incremental ones
+        fresh = statusbar.StatusTable()
+        for line in st._lines:
+            sb = fresh.add_status_line(line.label)
+            for chunk in line._progress._progress_chunks:
+                sb.add_progress(chunk.count, chunk.symbol)
+        self.assertEqual(fresh.format_table(width=30), third)
+
+    def test_batch_formatting(self):
+        lines = []
+        st = statusbar.StatusTable()
+        for i in range(2 * statusbar._BATCH_SIZE):
+            sb = st.add_status_line(str(i))
+            sb.add_progress(i % 7, "#", color="green")
+            sb.add_progress(i % 5 + 1, ".")
+            lines.append(sb)
+        formatted = st.format_table(width=50)
+        for line, sb in zip(formatted, lines):
+            sb._progress._changed()
+            self.assertEqual(line, sb.format_status(
+                label_width=st.label_width(),
+                progress_width=50 - st.label_width() - st.summary_width() - 2
+            ))
+
+    def test_table_changes(self):
+        st = statusbar.StatusTable()
+        self.assertEqual(st.format_table_changes(width=30), ([], []))
+
+        chunks = []
+        for label in ["a", "b", "c"]:
+            sb = st.add_status_line(label)
+            chunks.append(sb.add_progress(1, "#"))
+            sb.add_progress(1, " ")
+
+        lines, changed = st.format_table_changes(width=30)
+        self.assertEqual(changed, [0, 1, 2])
+        lines, changed = st.format_table_changes(width=30)
+        self.assertEqual(changed, [])
+
+        chunks[2].increment(5)
+        chunks[2].increment(1)
+        lines, changed = st.format_table_changes(width=30)
+        self.assertEqual(changed, [2])
+
+        # growing the summary field changes the alignment of all lines
+        chunks[0].increment(100)
+        self.assertEqual(st.summary_width(), len("101/1"))
+        lines, changed = st.format_table_changes(width=30)
+        self.assertEqual(changed, [0, 1, 2])
+
+        # and shrinking it back again as well
+        chunks[0].set(1)
+        self.assertEqual(st.summary_width(), len("7/1"))
+        self.assertEqual(st.label_width(), 1)
+        st._lines[1].label = "longer"
+        self.assertEqual(st.label_width(), len("longer"))
+        lines, changed = st.format_table_changes(width=30)
+        self.assertEqual(changed, [0, 1, 2])
+        self.assertTrue(lines[1].startswith("longer "))
+
+    def test_wide_labels_align(self):
+        labels = ["\u65e5\u672c\u8a9e\u3067\u3059" * 2,
+                  "abcdefghijklmnopqrstuvwxyz"]
+        st = statusbar.StatusTable()
+        cst = statusbar.CompactStatusTable()
+        cst.add_progress("#")
+        for label in labels:
+            st.add_status_line(label).add_progress(1, "#")
+            cst.add_status_line(label, [1])
+        # the truncated wide label has a column left over, which is padded.
+        self.assertEqual(st.calculate_field_widths(31)[0], 18)
+        for table in (st, cst):
+            lines = table.format_table(31)
+            self.assertEqual([display_width(line) for line in lines],
+                             [31, 31])
+            self.assertTrue(lines[0].startswith(
+                "\u65e5\u672c\u8a9e\u3067\u3059\u65e5\u672c.... ["))
+
+
+class TestCompactStatusTable(unittest.TestCase):
+    """Test of tables that store their lines compactly."""
+
+    def test_formats_like_status_table(self):
+        compact = statusbar.CompactStatusTable()
+        compact.add_progress("#", color="green")
+        compact.add_progress(".")
+        table = statusbar.StatusTable()
+        for i, counts in enumerate([(3, 7), (10, 0), (1, 99)]):
+            compact.add_status_line("line {}".format(i), counts)
+            sb = table.add_status_line("line {}".format(i))
+            sb.add_progress(counts[0], "#", color="green")
+            sb.add_progress(counts[1], ".")
+        self.assertEqual(compact.format_table(60), table.format_table(60))
+
+        line = compact.line(1)
+        line.increment(0, 5)
+        line.set(1, 1000)
+        line.label = "a much longer label"
+        self.assertEqual(line.counts(), [15, 1000])
+        lines, changed = compact.format_table_changes(60)
+        self.assertEqual(changed, [0, 1, 2])
+        self.assertEqual(display_width(lines[1]), 60)
+        compact.line(2).increment(0)
+        self.assertEqual(compact.format_table_changes(60)[1], [2])
+
+        with self.assertRaises(ValueError):
+            compact.add_progress("x")
+        with self.assertRaises(ValueError):
+            compact.add_status_line("too many", [1, 2, 3])
+
+    def test_memory_per_line(self):
+        import tracemalloc
+        compact = statusbar.CompactStatusTable()
+        for symbol in "#.x-":
+            compact.add_progress(symbol, color="green")
+        label = "a line"
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            for _ in range(10000):
+                compact.add_status_line(label, [1, 2, 3, 4])
+            used = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertLess(used / 10000, 100)
+
+
+class TestTracking(unittest.TestCase):
+    """Test of driving status lines from loops."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.saved_clock = statusbar._clock
+        statusbar._clock = lambda: self.now
+
+    def tearDown(self):
+        statusbar._clock = self.saved_clock
+
+    def test_track(self):
+        table = statusbar.StatusTable()
+        for n in [0, 1, 5, 21, 1000]:
+            items = list(statusbar.track(iter(range(n)), table, str(n)))
+            self.assertEqual(items, list(range(n)))
+            ok = table._lines[-1]._progress._progress_chunks[0]
+            self.assertEqual(ok.count, n)
+
+        # leaving the loop early counts the items that were taken.
+        for i in statusbar.track(range(100), table, "early"):
+            if i == 41:
+                break
+        chunks = table._lines[-1]._progress._progress_chunks
+        self.assertEqual([c.count for c in chunks], [42, 0, 0, 58])
+
+    def test_track_own_display(self):
+        saved, sys.stderr = sys.stderr, io.StringIO()
+        try:
+            self.assertEqual(sum(statusbar.track(range(10), label="x")), 45)
+            output = sys.stderr.getvalue()
+        finally:
+            sys.stderr = saved
+        self.assertEqual(output.splitlines()[-1], "x: 10/0/0/0 (100%)")
+
+    def test_batches_adapt(self):
+        from statusbar.tracking import _next_batch
+        self.assertEqual(_next_batch(1, 0.0, 0.1), 4)
+        self.assertEqual(_next_batch(1000, 0.001, 0.1), 4000)
+        self.assertEqual(_next_batch(1000, 0.5, 0.1), 200)
+
+        table = statusbar.StatusTable()
+        with table.row("jobs", total=10) as row:
+            ok = row._chunks[0]
+            row.ok()
+            self.assertEqual(ok.count, 1)
+            self.assertEqual(row._batch, 4)
+            for _ in range(3):
+                row.ok()
+            self.assertEqual(ok.count, 1)
+            row.fail()
+            self.assertEqual(ok.count, 4)
+            row.skip(2)
+            self.assertEqual(row.counts, (4, 1, 2))
+        chunks = row.line._progress._progress_chunks
+        self.assertEqual([c.count for c in chunks], [4, 1, 2, 3])
+
+
+class TestRenderStats(unittest.TestCase):
+    """Test of measuring how tables are rendered."""
+
+    def test_histogram(self):
+        from statusbar.stats import Histogram
+        histogram = Histogram()
+        for value in [0, 1, 3, 4, 100]:
+            histogram.add(value)
+        summary = histogram.as_dict()
+        self.assertEqual(summary['count'], 5)
+        self.assertEqual(summary['max'], 100)
+        self.assertEqual(summary['mean'], 108 / 5)
+        self.assertEqual(summary['buckets'], {0: 1, 1: 1, 3: 1, 7: 1, 127: 1})
+
+    def test_frames(self):
+        st = statusbar.StatusTable()
+        chunks = [st.add_status_line(str(i)).add_progress(1, "#")
+                  for i in range(3)]
+        self.assertIsNone(st.stats())
+        frames = []
+        st.enable_stats(frames.append)
+        display = statusbar.LiveDisplay(st, io.StringIO(), width=20)
+        display.refresh()
+        chunks[1].increment()
+        chunks[1].increment()
+        display.refresh(force=True)
+
+        self.assertEqual([f['rows'] for f in frames], [3, 1])
+        self.assertEqual(frames[1]['changes'], 1)
+        self.assertEqual(frames[1]['bytes'], len(display._shown[1]))
+        self.assertEqual(set(frames[0]),
+                         {'layout', 'chunks', 'summaries', 'lines', 'frame',
+                          'changes', 'rows', 'bytes'})
+        stats = st.stats()
+        self.assertEqual(stats['frames'], 2)
+        self.assertEqual(stats['rows']['total'], 4)
+        self.assertEqual(stats['written']['count'], 2)
+
+        st.disable_stats()
+        st.format_table(20)
+        self.assertIsNone(st.stats())
+        self.assertEqual(len(frames), 2)
+
+
+class TestRates(unittest.TestCase):
+    """Test of showing rates and estimated times left."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.saved_clock = statusbar._clock
+        statusbar._clock = lambda: self.now
+
+    def tearDown(self):
+        statusbar._clock = self.saved_clock
+
+    def test_formatting(self):
+        self.assertEqual(statusbar._format_rate(None), "     -/s")
+        self.assertEqual(statusbar._format_rate(12.34), "  12.3/s")
+        self.assertEqual(statusbar._format_rate(1234.0), "  1.2k/s")
+        self.assertEqual(statusbar._format_rate(5e6), "  5.0M/s")
+        self.assertEqual(statusbar._format_eta(None), "--:--:--")
+        self.assertEqual(statusbar._format_eta(65), " 0:01:05")
+        self.assertEqual(statusbar._format_eta(3 * 3600 + 7), " 3:00:07")
+        self.assertEqual(statusbar._format_eta(1e9), "    >99h")
+
+    def test_rate_and_eta(self):
+        sb = statusbar.StatusBar("work")
+        done = sb.add_progress(0, "#")
+        todo = sb.add_progress(100, ".")
+        sb.show_rate()
+        self.assertEqual(sb.summary_width(), len("0/100") + 1 + 17)
+        self.assertTrue(sb.format_status(60).endswith("     -/s --:--:--"))
+
+        for _ in range(4):
+            self.now += 1.0
+            done.increment(10)
+            todo.increment(-10)
+        # 40 done in 4 seconds, and 60 left
+        self.assertTrue(sb.format_status(60).endswith("  10.0/s  0:00:06"))
+
+        # the rate decays when nothing happens
+        self.now += 5.0
+        self.assertTrue(sb.format_status(60).endswith("   5.0/s  0:00:12"))
+
+    def test_table_rates(self):
+        st = statusbar.StatusTable()
+        first = st.add_status_line("first").add_progress(1, "#")
+        st.show_rates(eta=False)
+        second = st.add_status_line("second").add_progress(1, "#")
+        self.assertEqual(st.summary_width(), 1 + 1 + 8)
+
+        lines = st.format_table(width=40)
+        self.now += 2.0
+        first.increment(4)
+        second.increment(1)
+        lines = st.format_table(width=40)
+        self.assertTrue(lines[0].endswith("   2.0/s"))
+        self.assertTrue(lines[1].endswith("   0.5/s"))
+
+        # rates are updated even when the counts do not change
+        self.now += 5.0
+        lines, changed = st.format_table_changes(width=40)
+        self.assertEqual(changed, [0, 1])
+        self.assertTrue(lines[0].endswith("   1.0/s"))
+
+
+class TestGroups(unittest.TestCase):
+    """Test of tables with groups of lines."""
+
+    def make_table(self):
+        st = statusbar.StatusTable()
+        job = st.add_group("job")
+        stage1 = job.add_group("stage 1")
+        stage2 = job.add_group("stage 2")
+        shards = []
+        for stage in [stage1, stage2]:
+            for i in range(2):
+                line = stage.add_status_line("shard {}".format(i))
+                shards.append((line.add_progress(1, "#", color="green"),
+                               line.add_progress(3, ".")))
+        st.add_status_line("other").add_progress(1, "#")
+        return st, job, stage1, stage2, shards
+
+    def counts(self, line):
+        return [chunk.count for chunk in line._progress._progress_chunks]
+
+    def test_rolled_up_counts(self):
+        st, job, stage1, stage2, shards = self.make_table()
+        lines = st.format_table(width=50)
+        self.assertEqual(self.counts(job), [4, 12])
+        self.assertEqual(self.counts(stage1), [2, 6])
+        # groups take the style of the lines in them
+        self.assertEqual(job._progress._progress_chunks[0].color, "green")
+
+        labels = [line.split(".")[0].split(" [")[0] for line in lines]
+        self.assertEqual(labels, ["job", "  stage 1", "    shard 0",
+                                  "    shard 1", "  stage 2",
+                                  "    shard 0", "    shard 1", "other"])
+
+        shards[3][0].increment(2)
+        shards[3][1].increment(-2)
+        lines, changed = st.format_table_changes(width=50)
+        self.assertEqual(self.counts(stage2), [4, 4])
+        self.assertEqual(self.counts(job), [6, 10])
+        self.assertEqual(self.counts(stage1), [2, 6])
+        self.assertEqual(changed, [0, 4, 6])
+
+    def test_collapse(self):
+        st, job, stage1, stage2, shards = self.make_table()
+        expanded = st.format_table(width=50)
+        stage1.collapse()
+        lines, changed = st.format_table_changes(width=50)
+        self.assertEqual(lines, expanded[:2] + expanded[4:])
+
+        # hidden lines still count
+        shards[0][0].increment()
+        lines, changed = st.format_table_changes(width=50)
+        self.assertEqual(self.counts(stage1), [3, 6])
+        self.assertEqual(changed, [0, 1])
+
+        job.collapsed = True
+        self.assertEqual(len(st.format_table(width=50)), 2)
+        job.expand()
+        stage1.expand()
+        self.assertEqual(len(st.format_table(width=50)), 8)
+
+    def test_live_display_of_collapsed_group(self):
+        st, job, stage1, stage2, shards = self.make_table()
+        out = io.StringIO()
+        display = statusbar.LiveDisplay(st, out, max_fps=None, width=50,
+                                        hide_cursor=False)
+        display.refresh()
+        out.seek(0)
+        out.truncate()
+        job.collapse()
+        display.refresh()
+        lines = st.format_table(width=50)
+        # the second line is now "other"; the rest is cleared.
+        self.assertEqual(out.getvalue(), "\x1b[7A\x1b[1G{}\x1b[K"
+                         "\x1b[1B\r\x1b[J".format(lines[1]))
+
+
+class TestTableView(unittest.TestCase):
+    """Test of windows into a table."""
+
+    def make_table(self):
+        st = statusbar.StatusTable()
+        done, failed = [], []
+        for i in range(10):
+            sb = st.add_status_line("line {}".format(i))
+            done.append(sb.add_progress(i, "#"))
+            failed.append(sb.add_progress(0, "x"))
+            sb.add_progress(10 - i, ".")
+        return st, done, failed
+
+    def test_window(self):
+        st, done, failed = self.make_table()
+        view = statusbar.TableView(st, height=3)
+        lines = st.format_table(width=40)
+        self.assertEqual(view.format_view(width=40), lines[:3])
+        view.scroll(4)
+        self.assertEqual(view.format_view(width=40), lines[4:7])
+        view.scroll(100)
+        self.assertEqual(view.visible_lines(), [7, 8, 9])
+        view.scroll(-100)
+        self.assertEqual(view.visible_lines(), [0, 1, 2])
+
+    def test_sorted_views(self):
+        st, done, failed = self.make_table()
+        slowest = statusbar.TableView(st, sort='fraction', limit=3, height=5)
+        self.assertEqual(slowest.visible_lines(), [0, 1, 2])
+        self.assertEqual(len(slowest), 3)
+
+        done[0].set(10)
+        done[1].set(9)
+        self.assertEqual(slowest.visible_lines(), [2, 3, 4])
+
+        most_failed = statusbar.TableView(st, sort='count', chunk=1,
+                                          reverse=True, limit=2, height=5)
+        failed[6].increment(3)
+        failed[3].increment(5)
+        self.assertEqual(most_failed.visible_lines(), [3, 6])
+
+        by_label = statusbar.TableView(st, sort='label', reverse=True,
+                                       height=2)
+        self.assertEqual(by_label.visible_lines(), [9, 8])
+        st.add_status_line("line 99").add_progress(1, "#")
+        self.assertEqual(by_label.visible_lines(), [10, 9])
+        by_label.close()
+
+    def test_view_changes(self):
+        st, done, failed = self.make_table()
+        view = statusbar.TableView(st, sort='count', height=3)
+        lines, changed = view.format_table_changes(width=40)
+        self.assertEqual(changed, [0, 1, 2])
+        lines, changed = view.format_table_changes(width=40)
+        self.assertEqual(changed, [])
+        done[1].increment()  # still second smallest
+        lines, changed = view.format_table_changes(width=40)
+        self.assertEqual(changed, [1])
+        done[0].increment(5)  # moves out of the window
+        lines, changed = view.format_table_changes(width=40)
+        self.assertEqual(changed, [0, 1, 2])
+        self.assertEqual(view.visible_lines(), [1, 2, 3])
+
+
+class TestLiveDisplay(unittest.TestCase):
+    """Test of drawing a table on a terminal."""
+
+    def test_only_changes_are_written(self):
+        st = statusbar.StatusTable()
+        chunks = []
+        for label in ["a", "b", "c"]:
+            sb = st.add_status_line(label)
+            chunks.append(sb.add_progress(1, "#", color="green"))
+            sb.add_progress(3, ".")
+
+        out = io.StringIO()
+        display = statusbar.LiveDisplay(st, out, max_fps=None, width=30)
+        display.refresh()
+        first = out.getvalue()
+        self.assertEqual(first, "\x1b[?25l" +
+                         "".join(line + "\n" for line in st.format_table(30)))
+
+        out.seek(0)
+        out.truncate()
+        display.refresh()
+        self.assertEqual(out.getvalue(), "")
+
+        chunks[1].increment()
+        display.refresh()
+        frame = out.getvalue()
+        line = st.format_table(30)[1]
+        # up two lines, then rewrite from the bar's opening bracket.
+        prefix = "b ["
+        self.assertTrue(line.startswith(prefix))
+        self.assertEqual(frame, "\x1b[2A\x1b[{}G{}\x1b[K\x1b[2B\r".format(
+            len(prefix) + 1, line[len(prefix):]))
+
+        out.seek(0)
+        out.truncate()
+        st.add_status_line("d").add_progress(1, "#")
+        display.close()
+        self.assertEqual(out.getvalue(),
+                         st.format_table(30)[3] + "\n\x1b[?25h")
+
+    def test_wide_characters(self):
+        st = statusbar.StatusTable()
+        sb = st.add_status_line("\u65e5\u672c\u8a9e")
+        chunk = sb.add_progress(1, "#", color="green")
+        sb.add_progress(3, ".")
+        st.add_status_line("abcdefghij").add_progress(3, ".")
+        out = io.StringIO()
+        display = statusbar.LiveDisplay(st, out, max_fps=None, width=30)
+        display.refresh()
+        out.seek(0)
+        out.truncate()
+
+        chunk.increment(4)
+        display.refresh()
+        line = st.format_table(30)[0]
+        # the label and its padding take up ten columns, not seven.
+        prefix = "\u65e5\u672c\u8a9e.... ["
+        self.assertEqual(display_width(prefix), 12)
+        self.assertTrue(line.startswith(prefix))
+        self.assertEqual(out.getvalue(),
+                         "\x1b[2A\x1b[13G{}\x1b[K\x1b[2B\r".format(
+                             line[len(prefix):]))
+
+    def test_frames_are_coalesced(self):
+        st = statusbar.StatusTable()
+        chunk = st.add_status_line("a").add_progress(1, "#")
+        now = [0.0]
+        out = io.StringIO()
+        display = statusbar.LiveDisplay(st, out, max_fps=10, width=30)
+        display._clock = lambda: now[0]
+
+        self.assertTrue(display.refresh())
+        chunk.increment()
+        now[0] = 0.05
+        self.assertFalse(display.refresh())
+        now[0] = 0.1
+        self.assertTrue(display.refresh())
+        self.assertFalse(display.refresh())
+        self.assertTrue(display.refresh(force=True))
+
+
+class TestLogDisplay(unittest.TestCase):
+    """Test of writing progress to logs."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.saved_clock = statusbar._clock
+        statusbar._clock = lambda: self.now
+
+    def tearDown(self):
+        statusbar._clock = self.saved_clock
+
+    def test_snapshots(self):
+        st = statusbar.StatusTable()
+        sb = st.add_status_line("job")
+        done = sb.add_progress(0, "#", color="green")
+        todo = sb.add_progress(100, ".")
+        out = io.StringIO()
+        log = statusbar.LogDisplay(st, out, every_percent=10,
+                                   every_seconds=60)
+
+        def step(n):
+            done.increment(n)
+            todo.increment(-n)
+            log.refresh()
+
+        self.assertEqual(log.refresh(), 1)
+        self.assertEqual(out.getvalue(), "job: 0/100 (0%)\n")
+        for _ in range(9):
+            step(1)
+        self.assertEqual(out.getvalue(), "job: 0/100 (0%)\n")
+        step(1)
+        self.assertEqual(out.getvalue().splitlines()[-1], "job: 10/90 (10%)")
+
+        # slow progress is still reported now and then
+        step(1)
+        self.now += 61
+        log.refresh()
+        self.assertEqual(out.getvalue().splitlines()[-1], "job: 11/89 (11%)")
+        self.now += 61
+        log.refresh()
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+        step(89)
+        self.assertEqual(out.getvalue().splitlines()[-1], "job: 100/0 (100%)")
+        self.assertNotIn("\x1b", out.getvalue())
+
+    def test_json_snapshots(self):
+        st = statusbar.StatusTable()
+        chunk = st.add_status_line("a").add_progress(1, "#")
+        st.add_status_line("b").add_progress(1, "#")
+        out = io.StringIO()
+        with statusbar.LogDisplay(st, out, use_json=True) as log:
+            chunk.increment()
+            # the line was already complete, so it waits for close().
+            self.assertEqual(log.refresh(), 0)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r['label'] for r in records], ["a", "b", "a"])
+        self.assertEqual(records[-1]['counts'], [2])
+        self.assertEqual(records[-1]['fraction'], 1.0)
+
+    def test_complete_lines(self):
+        st = statusbar.StatusTable()
+        out = io.StringIO()
+        log = statusbar.LogDisplay(st, out, every_seconds=60)
+        row = st.row("unbounded")
+        for _ in range(50):
+            row.ok()
+            row.flush()
+            self.now += 0.1
+            log.refresh()
+        # a row without a total is always complete, so only its first
+        # snapshot and the ones every_seconds apart are written.
+        self.assertEqual(out.getvalue(), "unbounded: 1/0/0 (100%)\n")
+        self.now += 60
+        row.ok()
+        row.flush()
+        self.assertEqual(log.refresh(), 1)
+        self.assertEqual(log.refresh(), 0)
+
+    def test_auto_display(self):
+        st = statusbar.StatusTable()
+        self.assertIsInstance(statusbar.auto_display(st, io.StringIO()),
+                              statusbar.LogDisplay)
+
+        class Terminal(io.StringIO):
+            def isatty(self):
+                return True
+
+        self.assertIsInstance(statusbar.auto_display(st, Terminal()),
+                              statusbar.LiveDisplay)
+
+
+class TestTableExporter(unittest.TestCase):
+    """Test of exporting tables as JSON and Prometheus metrics."""
+
+    def setUp(self):
+        self.table = statusbar.StatusTable()
+        sb = self.table.add_status_line('say "hi"')
+        self.done = sb.add_progress(2, "#", color="green")
+        sb.add_progress(3, ".")
+        self.exporter = statusbar.TableExporter(self.table)
+
+    def tearDown(self):
+        self.exporter.close()
+
+    def test_json(self):
+        self.done.increment()
+        out = io.StringIO()
+        self.exporter.write_json(out)
+        record, = json.loads(out.getvalue())['lines']
+        self.assertEqual(record['label'], 'say "hi"')
+        self.assertEqual([c['count'] for c in record['chunks']], [2, 3])
+        self.assertEqual(record['chunks'][0]['color'], "green")
+
+        # new counts are only exported after an update
+        self.exporter.update()
+        out = io.StringIO()
+        self.exporter.write_json(out)
+        record, = json.loads(out.getvalue())['lines']
+        self.assertEqual(record['chunks'][0]['count'], 3)
+
+    def test_prometheus(self):
+        self.table.add_status_line("b").add_progress(7, "#")
+        self.exporter.update()
+        out = io.StringIO()
+        self.exporter.write_prometheus(out)
+        text = out.getvalue()
+        self.assertIn("statusbar_lines 2\n", text)
+        self.assertIn('statusbar_chunk_count{line="0",label="say \\"hi\\"",'
+                      'chunk="0",symbol="#",color="green"} 2\n', text)
+        self.assertIn('statusbar_chunk_count{line="1",label="b",'
+                      'chunk="0",symbol="#"} 7\n', text)
+
+    def test_serve(self):
+        import urllib.request
+        host, port = self.exporter.serve()
+        url = "http://{}:{}".format(host, port)
+        with urllib.request.urlopen(url + "/metrics") as response:
+            self.assertIn(b"statusbar_lines 1", response.read())
+        with urllib.request.urlopen(url + "/json") as response:
+            self.assertEqual(len(json.loads(response.read())['lines']), 1)
+
+
+class TestBackgroundDisplay(unittest.TestCase):
+    """Test of updating a table from several threads."""
+
+    def test_counts_from_threads(self):
+        out = io.StringIO()
+        display = statusbar.BackgroundDisplay(stream=out, interval=0.001,
+                                              width=30)
+        line = display.add_status_line("work")
+        done = line.add_progress(0, "#")
+        failed = line.add_progress(1, "x")
+
+        def work():
+            for _ in range(1000):
+                done.increment()
+            failed.increment(2)
+
+        with display:
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(done.count, 4000)
+        self.assertEqual(failed.count, 9)
+        final = display.table.format_table(30)[0]
+        self.assertTrue(final.endswith(termcolor.colored("4000") + "/" +
+                                       termcolor.colored("9")))
+        self.assertTrue(out.getvalue().endswith("\x1b[?25h"))
+
+
+def _count_in_worker(args):
+    counters, row = args
+    for _ in range(100):
+        counters.increment(row, 0)
+    counters.increment(row, 1, -100)
+
+
+class TestSharedStatusTable(unittest.TestCase):
+    """Test of tables updated from other processes."""
+
+    def test_counts_from_processes(self):
+        with statusbar.shared.SharedStatusTable(3, 2) as st:
+            for i in range(3):
+                sb = st.add_status_line("worker {}".format(i))
+                sb.add_progress(0, "#")
+                sb.add_progress(100, ".")
+            with self.assertRaises(ValueError):
+                st.add_status_line("one too many")
+
+            self.assertEqual(st.summary_width(), len("0/100"))
+            st.format_table(width=30)
+            self.assertEqual(st.counters.row_counts(1), [0, 100])
+
+            with multiprocessing.Pool(2) as pool:
+                pool.map(_count_in_worker,
+                         [(st.counters, row) for row in range(2)])
+
+            lines, changed = st.format_table_changes(width=30)
+            self.assertEqual(changed, [0, 1])
+            self.assertEqual(st.counters.row_counts(0), [100, 0])
+            self.assertEqual(st.counters.row_counts(2), [0, 100])
+            self.assertTrue(lines[0].endswith(
+                termcolor.colored("100") + "/" + termcolor.colored("0")))
+
+    def test_local_updates(self):
+        with statusbar.shared.SharedStatusTable(4, 2) as st:
+            chunk = st.add_status_line("parent").add_progress(0, "#")
+            st.format_table(width=30)
+            chunk.increment(5)
+            st.counters.increment(0, 0, 2)
+            st.format_table(width=30)
+            self.assertEqual(chunk.count, 7)
+            self.assertEqual(st.counters.row_counts(0), [7, 0])
+
+            with st.row("row") as row:
+                row.ok(3)
+            st.format_table(width=30)
+            self.assertEqual(row.counts, (3, 0, 0))
+            self.assertEqual(st.counters.row_counts(1), [3, 0])
+
+    def test_groups(self):
+        with statusbar.shared.SharedStatusTable(3, 1) as st:
+            group = st.add_group("group")
+            line = group.add_status_line("line")
+            line.add_progress(1, "#")
+            st.counters.increment(1, 0, 4)
+            lines = st.format_table(width=30)
+            self.assertEqual(len(lines), 2)
+            self.assertEqual(group._progress._progress_chunks[0].count, 5)
+            self.assertEqual(line._progress._progress_chunks[0].count, 5)
+            group.add_status_line("last")
+            with self.assertRaises(ValueError):
+                group.add_group("one too many")
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "no Unix sockets")
+class TestStatusServer(unittest.TestCase):
+    """Test of showing the progress of other processes."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.saved_clock = statusbar._clock
+        statusbar._clock = lambda: self.now
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "progress.sock")
+        self.out = io.StringIO()
+
+    def tearDown(self):
+        statusbar._clock = self.saved_clock
+        self.dir.cleanup()
+
+    def server(self):
+        table = statusbar.StatusTable()
+        return statusbar.daemon.StatusServer(
+            self.path, table, statusbar.LiveDisplay(table, self.out)
+        )
+
+    def test_batched_updates(self):
+        with self.server() as server:
+            client = statusbar.daemon.StatusClient(self.path, interval=0.25)
+            line = client.add_status_line("remote")
+            done = line.add_progress(0, "#", color="green", attrs=["bold"])
+            line.add_progress(10, ".")
+            for _ in range(10000):
+                done.increment()
+                self.now += 0.0001
+            # one second of updates is sent in a few frames.
+            self.assertLessEqual(server.poll(0), 5)
+            client.close()
+            self.assertEqual(server.poll(0), 1)
+
+            chunks = server.table._lines[0]._progress._progress_chunks
+            self.assertEqual([c.count for c in chunks], [10000, 10])
+            self.assertEqual(chunks[0].color, "green")
+            self.assertEqual(chunks[0].attrs, ["bold"])
+            self.assertEqual(server.table._lines[0].label, "remote")
+            self.assertEqual(server.poll(0), 0)
+
+    def test_server_not_running(self):
+        client = statusbar.daemon.StatusClient(self.path)
+        client.add_status_line("early").add_progress(1, "#").increment()
+        self.assertFalse(client.flush())
+        with self.server() as server:
+            self.assertTrue(client.flush())
+            server.poll(0)
+            chunks = server.table._lines[0]._progress._progress_chunks
+            self.assertEqual(chunks[0].count, 2)
+        client.close()
+
+    def test_server_not_polling(self):
+        with self.server() as server:
+            client = statusbar.daemon.StatusClient(self.path)
+            line = client.add_status_line("busy")
+            done = line.add_progress(0, "#")
+            # fill the server's queue with full frames; the client would
+            # block here if its socket did.
+            for i in range(10000):
+                line.add_progress(0, "x" * 1000)
+                if i % 10 == 0 and not client.flush():
+                    break
+            else:
+                self.fail("the server's queue never filled up")
+            done.increment()
+            self.assertFalse(client.flush())
+            while server.poll(0):
+                pass
+            self.assertTrue(client.flush())
+            server.poll(0)
+            chunks = server.table._lines[0]._progress._progress_chunks
+            self.assertEqual(chunks[0].count, 1)
+            self.assertEqual(len(chunks), i + 2)
+            client.close()
+
+    def test_bad_frames(self):
+        header = statusbar.daemon._HEADER.pack(statusbar.daemon._MAGIC, 1, 2)
+        record = statusbar.daemon._RECORD
+        line = record.pack(statusbar.daemon._LINE, 0, 0, 0) + \
+            statusbar.daemon._pack_string("line")
+        chunk = record.pack(statusbar.daemon._CHUNK, 0, 0, 1)
+        with self.server() as server:
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            for frame in [header + b"\x01\x02",
+                          header + line[:-2],
+                          header + record.pack(statusbar.daemon._LINE,
+                                               0, 0, 0) + b"\x02\x00\xff\xfe",
+                          header + line + chunk +
+                          statusbar.daemon._pack_string("#") +
+                          statusbar.daemon._pack_string("no such colour") +
+                          b"\x00\x00" * 2]:
+                sender.sendto(frame, self.path)
+            sender.close()
+            self.assertEqual(server.poll(0), 4)
+            # only the last frame could be read, and its chunk is dropped.
+            self.assertEqual(len(server.table._lines), 1)
+            self.assertEqual(server.table._lines[0].label, "line")
+            self.assertEqual(
+                server.table._lines[0]._progress._progress_chunks, []
+            )
+
+    def test_long_strings(self):
+        with self.server() as server:
+            client = statusbar.daemon.StatusClient(self.path)
+            line = client.add_status_line("\u65e5" * 100000)
+            line.add_progress(1, "#" * 100000)
+            line.add_progress(2, ".")
+            self.assertTrue(client.flush())
+            server.poll(0)
+            label = server.table._lines[0].label
+            self.assertEqual(label, "\u65e5" * 341)
+            chunks = server.table._lines[0]._progress._progress_chunks
+            self.assertEqual([c.count for c in chunks], [1, 2])
+            client.close()
+
+
+class TestHistory(unittest.TestCase):
+    """Test of recording a table and replaying it."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "history.log")
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def recorder(self, table, **kwargs):
+        recorder = statusbar.record.Recorder(table, self.path, **kwargs)
+        recorder._clock = lambda: self.now
+        return recorder
+
+    def test_replay(self):
+        table = statusbar.StatusTable()
+        line = table.add_status_line("first")
+        done = line.add_progress(0, "#", color="green", attrs=["bold"])
+        frames = []
+        with self.recorder(table, keyframe_bytes=32) as recorder:
+            for i in range(200):
+                done.increment(i % 7)
+                if i == 50:
+                    line.label = "renamed"
+                    line.add_progress(5, "-", color="red")
+                if i == 120:
+                    table.add_status_line("second").add_progress(i, "=")
+                self.now += 1.0
+                recorder.record()
+                frames.append((self.now, table.format_table(50)))
+
+        with statusbar.record.HistoryReader(self.path) as history:
+            self.assertEqual(history.start, 1001.0)
+            # the small keyframe_bytes forces many keyframes.
+            self.assertGreater(history._keyframes, 10)
+            for when, frame in frames:
+                self.assertEqual(history.table_at(when).format_table(50),
+                                 frame)
+                self.assertEqual(
+                    history.table_at(when + 0.5).format_table(50), frame
+                )
+            self.assertEqual(history.table_at(0).format_table(50),
+                             frames[0][1])
+
+    def test_deltas_are_small(self):
+        table = statusbar.StatusTable()
+        chunks = [table.add_status_line(str(i)).add_progress(0, "#")
+                  for i in range(100)]
+        with self.recorder(table) as recorder:
+            for i in range(1000):
+                chunks[i % 100].increment()
+                self.now += 0.1
+                recorder.record()
+        # a record with one change takes a handful of bytes.
+        self.assertLess(os.path.getsize(self.path), 10000)
+
+    def test_truncated_log(self):
+        table = statusbar.StatusTable()
+        done = table.add_status_line("line").add_progress(0, "#")
+        with self.recorder(table) as recorder:
+            for i in range(10):
+                done.increment()
+                self.now += 1.0
+                recorder.record()
+        with open(self.path, "r+b") as log:
+            log.truncate(os.path.getsize(self.path) - 1)
+        with statusbar.record.HistoryReader(self.path) as history:
+            table = history.table_at(self.now - 1.0)
+            self.assertEqual(table._lines[0]._progress._progress_chunks[0]
+                             .count, 9)
+
+    def test_not_a_log(self):
+        with open(self.path, "wb") as log:
+            log.write(b"something else")
+        with self.assertRaises(ValueError):
+            statusbar.record.HistoryReader(self.path)
+
+
+class TestAsyncLiveDisplay(unittest.TestCase):
+    """Test of refreshing a table from an event loop."""
+
+    def test_refresh_from_tasks(self):
+        st = statusbar.StatusTable()
+        out = io.StringIO()
+
+        async def work(display, label):
+            done = display.add_status_line(label).add_progress(0, "#")
+            for _ in range(10):
+                done.increment()
+                await asyncio.sleep(0.001)
+
+        async def main():
+            display = statusbar.aio.AsyncLiveDisplay(
+                st, out, interval=0.001, width=30, batch_size=2
+            )
+            async with display:
+                await asyncio.gather(*(work(display, str(i))
+                                       for i in range(5)))
+
+        asyncio.run(main())
+        lines = st.format_table(30)
+        self.assertEqual(len(lines), 5)
+        for line in lines:
+            self.assertTrue(line.endswith(termcolor.colored("10")))
+        self.assertTrue(out.getvalue().startswith("\x1b[?25l"))
+        self.assertTrue(out.getvalue().endswith("\x1b[?25h"))
+
+    def test_widths_change_while_formatting(self):
+        st = statusbar.StatusTable()
+        chunks = [st.add_status_line(str(i)).add_progress(9, "#")
+                  for i in range(10)]
+        display = statusbar.aio.AsyncLiveDisplay(st, io.StringIO(),
+                                                 width=30, batch_size=2)
+
+        async def grow():
+            chunks[5].increment()
+
+        async def main():
+            task = asyncio.ensure_future(grow())
+            await display._format_pending(30)
+            await task
+
+        asyncio.run(main())
+        # the lines were formatted again for the wider summaries, so
+        # format_table_changes finds them all in the lines' caches.
+        widths = st.calculate_field_widths(30)
+        self.assertEqual(widths[2], 2)
+        for line in st._lines:
+            self.assertEqual(line._status_cache[0], widths)
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Test that the benchmarks run and produce comparable results."""
+
+    def test_benchmark_results(self):
+        grid = {'rows': [2], 'chunks': [1, 3], 'width': [20],
+                'colored': [True]}
+        results = statusbar.bench.run(grid, min_time=0, out=None)
+        names = {r['benchmark'] for r in results}
+        self.assertIn('chunk_sizes', names)
+        self.assertIn('format_table_full', names)
+        self.assertIn('update_render', names)
+        self.assertEqual(len(results), 2 * 4 + 2 * 3)
+        for result in results:
+            self.assertGreater(result['calls'], 0)
+            self.assertGreaterEqual(result['seconds'], 0)
 
-        # first_label = formatted[0][:labelw]
-        # second_label = formatted[1][:labelw]
-        # first_status = formatted[0][-statusw:]
-        # second_status = formatted[1][-statusw:]
+        out = io.StringIO()
+        statusbar.bench.compare(results, results, out=out)
+        self.assertEqual(len(out.getvalue().splitlines()), len(results))
 
-        # self.assertEqual(first_label, "Test............")
-        # self.assertEqual(second_label, label2)
-        # self.assertEqual(first_status, "  1/1")
-        # self.assertEqual(second_status, "10/10")
+    def test_benchmark_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.json")
+            original = statusbar.bench.QUICK_GRID
+            statusbar.bench.QUICK_GRID = {'rows': [1], 'chunks': [1],
+                                          'width': [20], 'colored': [False]}
+            try:
+                statusbar.bench.main(["--min-time", "0", "--quiet",
+                                      "--output", path])
+            finally:
+                statusbar.bench.QUICK_GRID = original
+            with open(path) as f:
+                report = json.load(f)
+            self.assertIn('python', report)
+            self.assertEqual(len(report['results']), 7)